@@ -0,0 +1,35 @@
+"""Regenerate favicon.ico, favicon.png and the Telegram profile picture.
+
+Decodes logo_sketchy.png once and feeds the same image to both generators,
+saving an interpreter start and a PNG decode versus running the two
+scripts separately (which still work standalone). After the decode the
+two outputs are independent, so they are encoded on separate threads
+(Pillow and zlib release the GIL while resampling and deflating).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import UnidentifiedImageError
+
+from generate_favicon import make_favicon
+from generate_profile import LOGO_PATH, make_profile, open_rgba
+
+
+def generate_assets():
+    try:
+        logo = open_rgba(LOGO_PATH)
+    except (FileNotFoundError, UnidentifiedImageError) as e:
+        print(f"Error loading logo: {e}")
+        make_profile(None)
+        return
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [
+            executor.submit(make_profile, logo.copy()),
+            executor.submit(make_favicon, logo.copy()),
+        ]
+    for future in futures:
+        future.result()
+
+if __name__ == "__main__":
+    generate_assets()
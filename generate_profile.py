@@ -1,37 +1,189 @@
-from PIL import Image
+import io
+import os
+import struct
+import tempfile
 
-def create_profile_pic():
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+try:
+    import pyspng
+except ImportError:  # Optional fast encoder, fall back to OpenCV/Pillow
+    pyspng = None
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+LOGO_PATH = "/home/yorerm/V7/src/web/static/img/logo_sketchy.png"
+PROFILE_PATH = "/home/yorerm/V7/src/web/static/img/retador_telegram_profile.png"
+
+# Decoded-logo cache format: magic, width, height, then the raw RGBA bytes
+_CACHE_MAGIC = b"RGBA"
+_CACHE_HEADER = struct.Struct("<4sII")
+
+
+def _cache_dir():
+    """Per-user cache directory (never the shared temp dir)."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "retador")
+
+
+def _read_cache(cache_path):
+    """Return the cached RGBA image, or None on any miss (absent, short or corrupt file)."""
+    try:
+        with open(cache_path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < _CACHE_HEADER.size:
+        return None
+    magic, width, height = _CACHE_HEADER.unpack_from(data)
+    if (magic != _CACHE_MAGIC or not width or not height
+            or len(data) != _CACHE_HEADER.size + width * height * 4):
+        return None
+    pixels = memoryview(data)[_CACHE_HEADER.size:]
+    return Image.frombuffer("RGBA", (width, height), pixels, "raw", "RGBA", 0, 1)
+
+
+def _write_cache(cache_path, prefix, img):
+    """Atomically write the cache file and drop other `<prefix>*.rgba` entries."""
+    directory, name = os.path.split(cache_path)
+    try:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=prefix, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_CACHE_HEADER.pack(_CACHE_MAGIC, *img.size))
+                f.write(img.tobytes())
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        # Dumps keyed by older mtimes of the same logo are never read again
+        for stale in os.listdir(directory):
+            if stale != name and stale.startswith(prefix) and stale.endswith(".rgba"):
+                os.remove(os.path.join(directory, stale))
+    except OSError:
+        pass  # The cache is only an optimization
+
+
+def open_rgba(path):
+    """
+    Open an image as RGBA, skipping the copy when it already is.
+
+    The decoded pixels are cached in the per-user cache dir keyed by the
+    file's mtime, so unchanged logos skip the PNG decode on later runs.
+    """
+    prefix = f"{os.path.basename(path)}."
+    mtime_ns = os.stat(path).st_mtime_ns
+    cache_path = os.path.join(_cache_dir(), f"{prefix}{mtime_ns}.rgba")
+    img = _read_cache(cache_path)
+    if img is not None:
+        return img
+
+    img = Image.open(path)
+    img.load()
+    if img.mode != "RGBA":
+        img = img.convert("RGBA")
+
+    _write_cache(cache_path, prefix, img)
+    return img
+
+
+def write_file(output_path, data):
+    """Write an already encoded buffer with as few syscalls as possible."""
+    view = memoryview(data)
+    fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+def save_png(img, output_path):
+    """Write an RGBA image as PNG with the fastest encoder installed."""
+    if pyspng is None and cv2 is None:
+        buf = io.BytesIO()
+        img.save(buf, format="PNG", compress_level=1, optimize=False)
+        write_file(output_path, buf.getbuffer())
+        return
+    arr = np.ascontiguousarray(np.asarray(img, dtype=np.uint8))
+    if pyspng is not None:
+        data = pyspng.encode(arr, progressive=pyspng.ProgressiveMode.NONE, compress_level=1)
+    else:
+        bgra = cv2.cvtColor(arr, cv2.COLOR_RGBA2BGRA)
+        _, data = cv2.imencode(".png", bgra, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+    write_file(output_path, data)
+
+
+def make_profile(logo, output_path=PROFILE_PATH):
+    """Write the Telegram profile picture from a decoded RGBA logo (or None)."""
     # 1. Config
     size = (1000, 1000)
     # No external BG image, just solid color
     bg_color = (10, 10, 10, 255) # Almost black
-    logo_path = "/home/yorerm/V7/src/web/static/img/logo_sketchy.png"
-    output_path = "/home/yorerm/V7/src/web/static/img/retador_telegram_profile.png"
 
     # 2. Create Solid Background
-    bg = Image.new("RGBA", size, bg_color)
+    bg_arr = np.empty((size[1], size[0], 4), dtype=np.uint8)
+    bg_arr[...] = bg_color
 
     # 3. Add Logo
-    try:
-        logo = Image.open(logo_path).convert("RGBA")
-        
+    if logo is not None:
         # Logo size: 80% of width
-        logo_width = int(size[0] * 0.8)
-        ratio = logo_width / float(logo.size[0])
-        logo_height = int(float(logo.size[1]) * ratio)
-        logo = logo.resize((logo_width, logo_height), Image.Resampling.LANCZOS)
+        logo_width = size[0] * 8 // 10
+        logo_height = logo.size[1] * logo_width // logo.size[0]
+        # reducing_gap box-reduces large sources by an integer factor first
+        logo = logo.resize((logo_width, logo_height), Image.Resampling.LANCZOS, reducing_gap=3.0)
         
         # Center position
         x = (size[0] - logo_width) // 2
         y = (size[1] - logo_height) // 2
         
-        bg.paste(logo, (x, y), logo)
-    except Exception as e:
-        print(f"Error loading logo: {e}")
+        # Clip to the canvas like Image.paste does: logos taller than 1.25x
+        # their width overflow vertically and get a negative y
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + logo_width, size[0]), min(y + logo_height, size[1])
+
+        # Alpha-blend the logo onto the (opaque) background. Sketch logos are
+        # mostly fully opaque or fully transparent, so opaque pixels are
+        # copied and only the anti-aliased edge pixels are actually blended
+        if x0 < x1 and y0 < y1:
+            src = np.asarray(logo)[y0 - y:y1 - y, x0 - x:x1 - x]
+            src_alpha = src[..., 3]
+            opaque = src_alpha == 255
+            partial = (src_alpha > 0) & ~opaque
+            roi = bg_arr[y0:y1, x0:x1]
+            rgb = roi[..., :3]
+            rgb[opaque] = src[..., :3][opaque]
+            if partial.any():
+                alpha = src_alpha[partial, None].astype(np.float32) * (1 / 255)
+                blended = src[..., :3][partial] * alpha + rgb[partial] * (1 - alpha)
+                rgb[partial] = blended.astype(np.uint8)
+            roi[..., 3] = 255
 
     # 4. Save
-    bg.save(output_path)
-    print(f"Profile picture saved to {output_path}")
+    bg = Image.fromarray(bg_arr, mode="RGBA")
+    save_png(bg, output_path)
+
+    # Lossless WebP sibling for consumers that accept it: the flat background
+    # encodes much faster and smaller than PNG. The PNG stays the default.
+    webp_path = os.path.splitext(output_path)[0] + ".webp"
+    buf = io.BytesIO()
+    bg.save(buf, format="WEBP", lossless=True, quality=100, method=0)
+    write_file(webp_path, buf.getbuffer())
+    print(f"Profile picture saved to {output_path} and {webp_path}")
+
+
+def create_profile_pic():
+    try:
+        logo = open_rgba(LOGO_PATH)
+    except (FileNotFoundError, UnidentifiedImageError) as e:
+        print(f"Error loading logo: {e}")
+        logo = None
+    make_profile(logo)
 
 if __name__ == "__main__":
     create_profile_pic()
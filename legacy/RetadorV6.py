@@ -144,24 +144,29 @@ from asyncio import exceptions
 import logging
 from logging.handlers import TimedRotatingFileHandler
 from logging import config
+import sys
 import time
 import os  # GestiÃ³n de rutas y operaciones del sistema
 import gc  # RecolecciÃ³n de basura manual
 import re  # Expresiones regulares
 from datetime import datetime, timedelta, timezone
 from dataclasses import dataclass, field  # DefiniciÃ³n de clases de datos
-from typing import Any, List, Dict, Optional, Tuple  # Tipos para anotaciones
-from pytz import timezone as pytz_timezone, UTC  # GestiÃ³n de zonas horarias
+from typing import Any, FrozenSet, List, Dict, Optional, Tuple  # Tipos para anotaciones
+from zoneinfo import ZoneInfo  # GestiÃ³n de zonas horarias
 import html  # Para escapar caracteres HTML
-import random
-import statistics
+import functools
+import string
 import collections
-import asyncpg
+import types
 
 # Third-Party Libraries
+import numpy as np
 import aiohttp
 from aiohttp import ClientSession
-import pytz
+from cachetools import TTLCache
+from aiolimiter import AsyncLimiter
+import xxhash
+import ijson  # Parseo JSON en streaming (backend yajl2_c si esta disponible)
 import orjson  # OptimizaciÃ³n para lectura/escritura de JSON
 from redis import asyncio as aioredis  # Cliente asÃ­ncrono para Redis
 import aiogram
@@ -170,8 +175,19 @@ from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.methods import GetUpdates
-from concurrent.futures import ProcessPoolExecutor
-import multiprocessing
+
+try:
+    import uvloop
+except ImportError:  # Opcional (no disponible en Windows): se usa el bucle estandar
+    uvloop = None
+
+# Plantillas HTML precalculadas para los logs enviados a Telegram
+_LOG_PREFIXES = {
+    "ERROR": "ðŸ”´ <b>ERROR</b>\n<pre>",
+    "WARNING": "ðŸŸ¡ <b>WARNING</b>\n<pre>",
+}
+_LOG_PREFIX_DEFAULT = "ðŸŸ¡ <b>{level}</b>\n<pre>"
+_LOG_SUFFIX = "</pre>"
 
 #Envio de errores por telegram
 class TelegramLogHandler(logging.Handler):
@@ -180,37 +196,56 @@ class TelegramLogHandler(logging.Handler):
         self.bot_token = bot_token
         self.chat_id = chat_id
         self.min_level_telegram = logging.WARNING
-        self.last_messages = {}
+        self.max_tracked_messages = 512
         self.duplicate_timeout = 1800
+        # Deduplicacion por ventanas fijas de duplicate_timeout: los hashes de la
+        # ventana se descartan enteros al cambiar de ventana (sin comparar TTL en
+        # cada emit); dentro de la ventana, al llegar al tope se expulsa el mas antiguo
+        self._seen_bucket = 0
+        self._seen_hashes = collections.OrderedDict()
         self.telegram_lock = asyncio.Lock()
         self._message_queue = asyncio.Queue()
         self._background_task = None
+        self._bot = None  # Se crea en el primer envio y se reutiliza
+        self.max_batch_size = 20  # Logs agrupados por mensaje de Telegram
+        # Tope de mensajes al canal de logs: en una tormenta de errores se
+        # descarta el exceso (siguen saliendo por consola) en vez de inundarlo
+        self._send_limiter = AsyncLimiter(10, 60)
 
     def emit(self, record):
         if record.levelno < self.min_level_telegram:
             return
 
         try:
-            msg = self.format(record)
-            current_time = time.time()
+            bucket = int(time.time()) // self.duplicate_timeout
+            if bucket != self._seen_bucket:
+                self._seen_bucket = bucket
+                self._seen_hashes = collections.OrderedDict()
             
-            mensaje_base = f"{record.levelname}:{record.message}"
-            msg_hash = hash(mensaje_base)
+            mensaje_base = f"{record.levelname}:{record.getMessage()}"
+            # xxh3 es estable entre procesos (hash() depende de PYTHONHASHSEED)
+            msg_hash = xxhash.xxh3_64_intdigest(mensaje_base.encode('utf-8'))
             
-            if msg_hash in self.last_messages:
-                if current_time - self.last_messages[msg_hash] < self.duplicate_timeout:
-                    return
-                    
-            self.last_messages[msg_hash] = current_time
-            self.last_messages = {
-                k: v for k, v in self.last_messages.items()
-                if current_time - v < self.duplicate_timeout
-            }
+            if msg_hash in self._seen_hashes:
+                return
+            if len(self._seen_hashes) >= self.max_tracked_messages:
+                self._seen_hashes.popitem(last=False)
+            self._seen_hashes[msg_hash] = None
+
+            # Formatear solo los mensajes que realmente se van a enviar
+            msg = self.format(record)
             
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                print(f"TelegramLogHandler sin event loop: {msg}")
+                return
+
             if self._background_task is None or self._background_task.done():
-                self._background_task = asyncio.create_task(self._background_sender())
+                self._background_task = loop.create_task(self._background_sender())
             
-            asyncio.create_task(self._message_queue.put((msg, record.levelname)))
+            # La cola no tiene limite: put_nowait nunca bloquea y evita crear una Task por log
+            self._message_queue.put_nowait((msg, record.levelname))
         
         except Exception as e:
             print(f"Error en TelegramLogHandler: {e}")
@@ -218,24 +253,73 @@ class TelegramLogHandler(logging.Handler):
     async def _background_sender(self):
         while True:
             try:
-                msg, level = await self._message_queue.get()
+                # Vaciar lo pendiente para enviar varios logs en una sola llamada
+                items = [await self._message_queue.get()]
+                try:
+                    while len(items) < self.max_batch_size:
+                        items.append(self._message_queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    pass
+
+                blocks = []
+                for msg, level in items:
+                    prefix = _LOG_PREFIXES.get(level) or _LOG_PREFIX_DEFAULT.format(level=level)
+                    escaped = self._truncate_escaped(html.escape(msg))
+                    blocks.append(prefix + escaped + _LOG_SUFFIX)
+
                 async with self.telegram_lock:
-                    bot = Bot(token=self.bot_token)
-                    try:
-                        emoji = "ðŸ”´" if level == "ERROR" else "ðŸŸ¡"
-                        formatted_message = f"{emoji} <b>{level}</b>\n<pre>{html.escape(msg)}</pre>"  # â† HTML
-                        
-                        await bot.send_message(
+                    if self._bot is None:
+                        self._bot = Bot(token=self.bot_token)
+                    for text in self._pack_blocks(blocks):
+                        if not self._send_limiter.has_capacity():
+                            continue
+                        await self._send_limiter.acquire()
+                        await self._bot.send_message(
                             chat_id=self.chat_id,
-                            text=formatted_message,
+                            text=text,
                             parse_mode=ParseMode.HTML,
                             disable_web_page_preview=True
                         )
-                    finally:
-                        await bot.session.close()
             except Exception as e:
                 print(f"Error en background sender: {e}")
-            await asyncio.sleep(0.1)
+
+    @staticmethod
+    def _truncate_escaped(escaped: str, limit: int = 3900) -> str:
+        """Recorta texto ya escapado sin partir una entidad HTML."""
+        if len(escaped) <= limit:
+            return escaped
+        cut = escaped[:limit]
+        amp = cut.rfind('&')
+        if amp > cut.rfind(';'):
+            cut = cut[:amp]
+        return cut + '...'
+
+    @staticmethod
+    def _pack_blocks(blocks: List[str], limit: int = 4096) -> List[str]:
+        """Agrupa bloques HTML en mensajes que respetan el limite de Telegram."""
+        messages = []
+        current = ''
+        for block in blocks:
+            if current and len(current) + 1 + len(block) > limit:
+                messages.append(current)
+                current = block
+            else:
+                current = f"{current}\n{block}" if current else block
+        if current:
+            messages.append(current)
+        return messages
+
+    async def aclose(self):
+        """Detiene el sender y cierra la sesion del bot reutilizado."""
+        if self._background_task and not self._background_task.done():
+            self._background_task.cancel()
+            try:
+                await self._background_task
+            except asyncio.CancelledError:
+                pass
+        if self._bot is not None:
+            await self._bot.session.close()
+            self._bot = None
 
 
 
@@ -280,6 +364,7 @@ class BotConfig:
       
     # ParÃ¡metros de la API
     LIMIT: int = 5000                    # LÃ­mite de registros por peticiÃ³n
+    INCREMENTAL_LIMIT: int = 500         # Registros por peticion cuando ya hay cursor (ADR-009)
     PRODUCT: str = 'surebets'            # Tipo de producto a consultar
     SPORTS: List[str] = field(default_factory=lambda: [
         'AmericanFootball', 'Badminton', 'Baseball', 'Basketball', 'CounterStrike',
@@ -365,6 +450,25 @@ class BotConfig:
     # Control de concurrencia
     CONCURRENT_PICKS: int = 250           # Procesamiento paralelo de picks
     CONCURRENT_REQUESTS: int = 100        # Peticiones HTTP concurrentes
+    VALIDATION_WORKERS: int = 32          # Workers de validacion de picks
+    REDIS_WORKERS: int = 16               # Workers de Redis (tambien tamano del pool)
+    TELEGRAM_WORKERS: int = 16            # Workers de envio a Telegram
+
+    # Versiones frozenset de las listas para comprobaciones de pertenencia O(1)
+    # (las listas se mantienen para iterar/join)
+    BOOKMAKERS_SET: FrozenSet[str] = field(init=False)
+    TARGET_BOOKIES_SET: FrozenSet[str] = field(init=False)
+    SPORTS_SET: FrozenSet[str] = field(init=False)
+    BOOKIE_CONTRAPARTIDAS_SETS: Dict[str, FrozenSet[str]] = field(init=False)
+
+    def __post_init__(self):
+        self.BOOKMAKERS_SET = frozenset(self.BOOKMAKERS)
+        self.TARGET_BOOKIES_SET = frozenset(self.TARGET_BOOKIES)
+        self.SPORTS_SET = frozenset(self.SPORTS)
+        self.BOOKIE_CONTRAPARTIDAS_SETS = {
+            bookie: frozenset(contrapartidas)
+            for bookie, contrapartidas in self.BOOKIE_CONTRAPARTIDAS.items()
+        }
     
 
 class ConnectionManager:
@@ -389,18 +493,17 @@ class ConnectionManager:
         )
         
         # Conector TCP con parÃ¡metros optimizados
-        # Quitamos keepalive_timeout ya que usamos force_close=True
+        # Keep-alive: las peticiones reutilizan la conexion TCP+TLS;
+        # enable_cleanup_closed se encarga de los sockets muertos
         self.connector = aiohttp.TCPConnector(
             limit=config.CONCURRENT_REQUESTS * 2,
             limit_per_host=config.CONNECTIONS_PER_HOST * 2,
             enable_cleanup_closed=True,
-            force_close=True,  # True para evitar conexiones zombies
+            force_close=False,
+            keepalive_timeout=30,
             ttl_dns_cache=300,
             use_dns_cache=True
         )
-        
-        # Periodo de enfriamiento entre sesiones
-        self.session_cooling_period = 30
 
     async def create_session(self) -> aiohttp.ClientSession:
         """Crea una nueva sesiÃ³n HTTP con mejor manejo de errores."""
@@ -438,17 +541,12 @@ class ConnectionManager:
                 limit=self.config.CONCURRENT_REQUESTS * 2,
                 limit_per_host=self.config.CONNECTIONS_PER_HOST * 2,
                 enable_cleanup_closed=True,
-                force_close=True,
+                force_close=False,
+                keepalive_timeout=30,
                 ttl_dns_cache=300,
                 use_dns_cache=True
             )
             
-            # Forzar recolecciÃ³n de basura
-            gc.collect()
-            
-            # Esperar para asegurar que todo se ha cerrado
-            await asyncio.sleep(self.session_cooling_period)
-            
         except Exception as e:
             logger.error(f"Error en cleanup_session: {e}")
 
@@ -547,8 +645,26 @@ class RequestQueue:
         self.request_lock = asyncio.Lock()
         
         # Sistema de cachÃ© para resultados
-        self.results_cache = {}
-        self.cleanup_task = None
+        # TTLCache expira las entradas al acceder, sin tarea de limpieza periodica
+        self.results_cache = TTLCache(maxsize=config.CACHE_MAX_SIZE, ttl=config.CACHE_TTL)
+
+        # Parametros por defecto precalculados una sola vez (se usan en cada poll)
+        self._default_params = {
+            'product': config.PRODUCT,
+            'limit': config.LIMIT,
+            'source': '|'.join(config.BOOKMAKERS),
+            'sport': '|'.join(config.SPORTS),
+            'order': 'created_at_desc',
+            'min-profit': '-1'
+        }
+        self._default_cache_key = self._build_cache_key(self._default_params)
+
+        # Cursor incremental (ADR-009): formato '{sort_by}:{id}' del ultimo pick recibido
+        self._last_cursor: Optional[str] = None
+
+    @staticmethod
+    def _build_cache_key(params: dict) -> str:
+        return sys.intern(f"{params.get('product')}:{params.get('source')}")
 
     async def _enforce_rate_limit(self):
         """
@@ -556,7 +672,7 @@ class RequestQueue:
         Usa un sistema de ventana deslizante para mayor precisiÃ³n.
         """
         async with self.request_lock:
-            current_time = time.time()
+            current_time = time.monotonic()
             
             # Limpiar timestamps antiguos (mÃ¡s de 1 segundo)
             while (self.last_request_times and 
@@ -564,42 +680,57 @@ class RequestQueue:
                 self.last_request_times.popleft()
             
             # Si alcanzamos el lÃ­mite, esperar el tiempo necesario
+            wait_time = 0.0
             if len(self.last_request_times) >= self.config.REQUEST_RATE_LIMIT:
-                wait_time = 1.0 - (current_time - self.last_request_times[0])
-                if wait_time > 0:
-                    await asyncio.sleep(wait_time)
+                wait_time = max(0.0, 1.0 - (current_time - self.last_request_times[0]))
             
-            self.last_request_times.append(current_time)
+            # Reservar el hueco (timestamp futuro) y soltar el lock antes de dormir
+            self.last_request_times.append(current_time + wait_time)
+
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
 
-    async def execute_request(self, method: str, url: str, **kwargs):
+    async def execute_request(self, method: str, url: str, stream_items: Optional[str] = None, **kwargs):
         """
         Ejecuta una peticiÃ³n HTTP respetando el rate limit y manejando reintentos.
         
         Args:
             method: MÃ©todo HTTP (GET, POST, etc)
             url: URL del endpoint
+            stream_items: Prefijo ijson (p.ej. 'records.item'). Si se indica, los
+                elementos se parsean en streaming segun llegan y se devuelve la lista
             **kwargs: Argumentos adicionales para la peticiÃ³n
             
         Returns:
-            dict: Respuesta JSON de la API o None si falla
+            dict: Respuesta JSON de la API (o list con stream_items) o None si falla
         """
         for attempt in range(self.config.REQUEST_RETRIES):
             try:
                 await self._enforce_rate_limit()
                 session = await self.connection_manager.get_session()
                 
-                async with session.request(method, url, **kwargs) as response:
+                response = await session.request(method, url, **kwargs)
+                try:
                     if response.status == 200:
-                        return await response.json()
+                        if stream_items:
+                            return [
+                                item async for item in ijson.items_async(
+                                    response.content, stream_items, use_float=True
+                                )
+                            ]
+                        return orjson.loads(await response.read())
+                finally:
+                    # Devolver la conexion al pool keep-alive antes de cualquier espera
+                    response.release()
+
+                if response.status == 429:  # Rate limit excedido
+                    retry_after = int(response.headers.get('Retry-After', 5))
+                    await asyncio.sleep(retry_after)
+                    continue
                     
-                    if response.status == 429:  # Rate limit excedido
-                        retry_after = int(response.headers.get('Retry-After', 5))
-                        await asyncio.sleep(retry_after)
-                        continue
-                        
-                    # Incrementar contador de errores y esperar antes de reintentar
-                    self.connection_manager.session_errors += 1
-                    await asyncio.sleep(self.config.BASE_DELAY * (2 ** attempt))
+                # Incrementar contador de errores y esperar antes de reintentar
+                self.connection_manager.session_errors += 1
+                await asyncio.sleep(self.config.BASE_DELAY * (2 ** attempt))
                     
             except Exception as e:
                 self.connection_manager.session_errors += 1
@@ -618,34 +749,44 @@ class RequestQueue:
         Returns:
             List[dict]: Lista de picks o lista vacÃ­a si hay error
         """
-        if params is None:
-            params = {
-                'product': self.config.PRODUCT,
-                'limit': self.config.LIMIT,
-                'source': '|'.join(self.config.BOOKMAKERS),
-                'sport': '|'.join(self.config.SPORTS),
-                'order': 'value_desc'
-            }
-            
-        cache_key = f"{params.get('product')}:{params.get('source')}"
-        current_time = time.time()
+        incremental = params is None
+        if incremental:
+            params = self._default_params
+            cache_key = self._default_cache_key
+            if self._last_cursor:
+                # Solo picks nuevos desde el ultimo poll
+                params = {**params, 'cursor': self._last_cursor, 'limit': self.config.INCREMENTAL_LIMIT}
+                cache_key = f"{cache_key}:{self._last_cursor}"
+        else:
+            cache_key = self._build_cache_key(params)
         
         # Verificar cachÃ©
-        if cache_key in self.results_cache:
-            cache_time, cache_data = self.results_cache[cache_key]
-            if current_time - cache_time < self.config.CACHE_TTL:
-                return cache_data
+        cache_data = self.results_cache.get(cache_key)
+        if cache_data is not None:
+            return cache_data
 
         try:
-            data = await self.execute_request('GET', self.config.API_URL, params=params)
-            if data and 'records' in data:
-                # Ordenar los picks por profit de manera descendente
-                sorted_picks = sorted(
-                    data['records'],
-                    key=lambda x: float(x.get('profit', 0)),
-                    reverse=True
+            # Los records se parsean en streaming mientras llega el body, sin
+            # bufferizar el payload completo (hasta LIMIT picks) antes de parsear
+            records = await self.execute_request(
+                'GET', self.config.API_URL, stream_items='records.item', params=params
+            )
+            if records is not None:
+                if incremental and records:
+                    last_pick = records[-1]
+                    self._last_cursor = f"{last_pick.get('sort_by', 'created_at')}:{last_pick.get('id', '')}"
+
+                # Ordenar los picks por profit de manera descendente. El orden del
+                # servidor es created_at_desc (cursor), asi que se ordena aqui:
+                # argsort vectorizado (estable, igual que sorted(reverse=True))
+                profits = np.fromiter(
+                    (float(record.get('profit') or 0) for record in records),
+                    dtype=np.float64,
+                    count=len(records)
                 )
-                self.results_cache[cache_key] = (current_time, sorted_picks)
+                order = np.argsort(-profits, kind='stable')
+                sorted_picks = [records[i] for i in order]
+                self.results_cache[cache_key] = sorted_picks
                 return sorted_picks
             return []
             
@@ -653,37 +794,8 @@ class RequestQueue:
             logger.error(f"Error obteniendo picks: {e}")
             return []
 
-    async def start_cache_cleanup(self):
-        """Inicia la tarea de limpieza periÃ³dica de cachÃ©."""
-        if self.cleanup_task is None:
-            self.cleanup_task = asyncio.create_task(self._periodic_cache_cleanup())
-
-    async def _periodic_cache_cleanup(self):
-        """Limpia periÃ³dicamente entradas antiguas del cachÃ©."""
-        while True:
-            try:
-                await asyncio.sleep(30)
-                current_time = time.time()
-                
-                self.results_cache = {
-                    k: (t, d) for k, (t, d) in self.results_cache.items()
-                    if current_time - t < self.config.CACHE_TTL
-                }
-                
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                logger.error(f"Error en limpieza de cachÃ©: {e}")
-
     async def cleanup(self):
         """Limpia recursos y cancela tareas pendientes."""
-        if self.cleanup_task and not self.cleanup_task.cancelled():
-            self.cleanup_task.cancel()
-            try:
-                await self.cleanup_task
-            except asyncio.CancelledError:
-                pass
-            
         self.results_cache.clear()
         self.last_request_times.clear()
         
@@ -696,14 +808,14 @@ class ConcurrencyManager:
 
     async def execute(self, func, *args, **kwargs):
         try:
-            async with asyncio.timeout(self.config.REQUEST_TIMEOUT):
-                async with self.semaphore:
-                    return await func(*args, **kwargs)
+            # El plazo empieza al obtener el semaforo: la espera en cola no cuenta
+            async with self.semaphore:
+                return await asyncio.wait_for(func(*args, **kwargs), self.config.REQUEST_TIMEOUT)
         except asyncio.TimeoutError:
-            logger.error(f"Timeout despuÃ©s de {self.config.REQUEST_TIMEOUT}s")
+            logger.error("Timeout despuÃ©s de %ss", self.config.REQUEST_TIMEOUT)
             raise
         except Exception as e:
-            logger.error(f"Error en ejecuciÃ³n concurrente: {e}")
+            logger.error("Error en ejecuciÃ³n concurrente: %s", e)
             raise
 
 
@@ -714,13 +826,14 @@ class OptimizedPrefetchManager:
         self.prefetch_queue = asyncio.Queue(maxsize=config.CACHE_MAX_SIZE)
         self.is_running = False
         self.fetch_task = None
+        self.next_fetch_task = None  # Peticion siguiente ya en vuelo
 
     async def _fetch_next_batch(self) -> Optional[List[dict]]:
         """Obtener siguiente lote de datos"""
         try:
             return await self.request_queue.fetch_picks()
         except Exception as e:
-            logger.error(f"Error en prefetch: {e}")
+            logger.error("Error en prefetch: %s", e)
             return None
 
     async def start_prefetching(self):
@@ -732,13 +845,23 @@ class OptimizedPrefetchManager:
         """Loop principal de prefetch"""
         while self.is_running:
             try:
-                if not self.prefetch_queue.full():
+                if self.next_fetch_task is not None:
+                    data = await self.next_fetch_task
+                    self.next_fetch_task = None
+                else:
                     data = await self._fetch_next_batch()
-                    if data:
-                        await self.prefetch_queue.put(data)
-                await asyncio.sleep(0.1)
+                if data:
+                    # Lanzar ya la siguiente peticion para solapar la ida y vuelta
+                    # de red con el encolado (el cursor impide varias en paralelo)
+                    self.next_fetch_task = asyncio.create_task(self._fetch_next_batch())
+                    # put bloquea si la cola esta llena y despierta en cuanto el
+                    # consumidor libera un hueco (sin sondeo a intervalo fijo)
+                    await self.prefetch_queue.put(data)
+                else:
+                    # Sin picks nuevos: ceder el bucle (la respuesta puede venir de cache)
+                    await asyncio.sleep(self.config.SLEEP_INTERVAL)
             except Exception as e:
-                logger.error(f"Error en ciclo de prefetch: {e}")
+                logger.error("Error en ciclo de prefetch: %s", e)
                 await asyncio.sleep(1)
 
     async def get_next_data(self) -> Optional[List[dict]]:
@@ -746,18 +869,20 @@ class OptimizedPrefetchManager:
         try:
             return await self.prefetch_queue.get()
         except Exception as e:
-            logger.error(f"Error obteniendo datos del buffer: {e}")
+            logger.error("Error obteniendo datos del buffer: %s", e)
             return None
 
     async def cleanup(self):
         """Limpieza de recursos"""
         self.is_running = False
-        if self.fetch_task and not self.fetch_task.cancelled():
-            self.fetch_task.cancel()
-            try:
-                await self.fetch_task
-            except asyncio.CancelledError:
-                pass
+        for task in (self.fetch_task, self.next_fetch_task):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self.next_fetch_task = None
         
         # Limpiar cola de prefetch
         while not self.prefetch_queue.empty():
@@ -771,49 +896,40 @@ class OptimizedPrefetchManager:
 # Borrados de cache auto
 class CacheManager:
     def __init__(self, max_size: int = 1000):
-        self.cache = {}
+        # OrderedDict como LRU: el orden de insercion/acceso sustituye a access_times
+        self.cache = collections.OrderedDict()
         self.max_size = max_size
-        self.access_times = {}
-        self.lock = asyncio.Lock()  # AÃ±adido lock para thread-safety
         self._cleanup_task = None
         self._last_cleanup = time.time()
         self.cleanup_interval = 300  # 5 minutos
 
     def get(self, key: str) -> Optional[Any]:
-        if key in self.cache:
-            self.access_times[key] = time.time()
-            return self.cache[key]
-        return None
-
-    async def set(self, key: str, value: Any) -> None:
-        """Establece un valor en la cachÃ© de manera thread-safe"""
-        async with self.lock:
-            current_time = time.time()
-            self.cache[key] = value
-            self.access_times[key] = current_time
-            
-            # Iniciar limpieza automÃ¡tica si es necesario
-            if not self._cleanup_task or self._cleanup_task.done():
-                self._cleanup_task = asyncio.create_task(self._auto_cleanup())
-            
-            # Limpiar cache si excede el tamaÃ±o mÃ¡ximo
-            if len(self.cache) > self.max_size:
-                await self._cleanup(int(self.max_size * 0.2))
-
+        value = self.cache.get(key)
+        if value is not None:
+            self.cache.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Establece un valor en la cache (operaciones de dict atomicas, sin lock)"""
+        self.cache[key] = value
+        self.cache.move_to_end(key)
+        
+        # Iniciar limpieza automÃ¡tica si es necesario
+        if not self._cleanup_task or self._cleanup_task.done():
+            self._cleanup_task = asyncio.create_task(self._auto_cleanup())
+        
+        # Limpiar cache si excede el tamaÃ±o mÃ¡ximo
+        if len(self.cache) > self.max_size:
+            self._evict(int(self.max_size * 0.2))
 
+    def _evict(self, num_entries: int) -> None:
+        """Expulsa las num_entries entradas menos usadas recientemente (O(k))."""
+        for _ in range(min(num_entries, len(self.cache))):
+            self.cache.popitem(last=False)
 
-    async def _cleanup(self, num_entries: int) -> None:
+    def _cleanup(self, num_entries: int) -> None:
         """Limpia un nÃºmero especÃ­fico de entradas mÃ¡s antiguas"""
-        async with self.lock:
-            if not self.access_times:
-                return
-                
-            entries = sorted(self.access_times.items(), key=lambda x: x[1])
-            to_remove = entries[:num_entries]
-            
-            for key, _ in to_remove:
-                del self.cache[key]
-                del self.access_times[key]
+        self._evict(num_entries)
 
     async def _auto_cleanup(self) -> None:
         """Tarea de limpieza automÃ¡tica"""
@@ -821,7 +937,7 @@ class CacheManager:
             try:
                 current_time = time.time()
                 if current_time - self._last_cleanup >= self.cleanup_interval:
-                    await self._cleanup(int(self.max_size * 0.1))
+                    self._cleanup(int(self.max_size * 0.1))
                     self._last_cleanup = current_time
                 await asyncio.sleep(60)  # Verificar cada minuto
             except asyncio.CancelledError:
@@ -830,11 +946,9 @@ class CacheManager:
                 print(f"Error en auto_cleanup: {e}")
                 await asyncio.sleep(60)
 
-    async def clear(self) -> None:
+    def clear(self) -> None:
         """Limpia toda la cachÃ©"""
-        async with self.lock:
-            self.cache.clear()
-            self.access_times.clear()
+        self.cache.clear()
 
     async def cleanup(self) -> None:
         """Limpia recursos"""
@@ -844,23 +958,55 @@ class CacheManager:
                 await self._cleanup_task
             except asyncio.CancelledError:
                 pass
-        await self.clear()
+        self.clear()
 
 
 
 
 # Gestion para validar picks con Redis
+_TZ_MADRID = ZoneInfo("Europe/Madrid")
+
+
+class _StripPunctuationTable(dict):
+    r"""Tabla para str.translate equivalente a re.sub(r'[^\w\s]', '', text).
+
+    Se rellena bajo demanda: cada codepoint se clasifica una sola vez.
+    """
+
+    def __missing__(self, codepoint: int) -> Optional[int]:
+        char = chr(codepoint)
+        keep = char.isalnum() or char == '_' or char.isspace()
+        value = codepoint if keep else None
+        self[codepoint] = value
+        return value
+
+
+_STRIP_PUNCTUATION = _StripPunctuationTable()
+
+# KEYS: claves, ARGV: un TTL por clave seguido del valor comun
+_SETEX_MANY_LUA = """
+local value = ARGV[#KEYS + 1]
+for i = 1, #KEYS do
+    redis.call('SETEX', KEYS[i], ARGV[i], value)
+end
+return #KEYS
+"""
+
 class RedisHandler:
-    def __init__(self, host='localhost', port=6379, db=0, password='PASSWORD', MIN_EVENT_TIME: int = 30):
+    def __init__(self, host='localhost', port=6379, db=0, password='PASSWORD', MIN_EVENT_TIME: int = 30,
+                 max_connections: int = 500):
         self.logger = logging.getLogger(__name__)
 
-        self.pool = aioredis.ConnectionPool(
+        # Pool unico y bloqueante: los picks concurrentes esperan a reutilizar una
+        # conexion libre en vez de abrir sockets nuevos (o fallar al agotar el pool)
+        self.pool = aioredis.BlockingConnectionPool(
             host=host,
             port=port,
             db=db,
             password=password,
             decode_responses=True,
-            max_connections=500,
+            max_connections=max_connections,
+            timeout=5,
             socket_timeout=5,
             retry_on_timeout=True
         )
@@ -876,8 +1022,11 @@ class RedisHandler:
         self.local_cache = CacheManager(max_size=2000)  # Aumentado el tamaÃ±o
         self._pipeline_size = 50
         self._cache_lock = asyncio.Lock()
+        # SETEX de todo un lote en un unico comando (EVALSHA; redis-py recarga
+        # el script automaticamente si el servidor responde NOSCRIPT)
+        self._setex_many = self.redis.register_script(_SETEX_MANY_LUA)
         
-        self.opposite_markets = {
+        opposite_markets = {
             'ah1': 'ah2', 'ah2': 'ah1',
             'win1': 'win2', 'win2': 'win1',
             'winonly1': 'winonly2', 'winonly2': 'winonly1',
@@ -891,6 +1040,11 @@ class RedisHandler:
             'win1 qualify': 'win2 qualify',
             'BETWEENMARGINH1': 'BETWEENMARGINH2'
         }
+        # Normalizado una vez a tuplas: get_market_opposites no comprueba tipos ni crea listas
+        self.opposite_markets = {
+            market: (opposite,) if isinstance(opposite, str) else tuple(opposite)
+            for market, opposite in opposite_markets.items()
+        }
 
 
     async def is_pick_sent_batch(self, picks: List[dict]) -> Dict[str, bool]:
@@ -908,55 +1062,54 @@ class RedisHandler:
         if not keys_to_check:
             return results
             
-        # VerificaciÃ³n en Redis usando pipeline
+        # VerificaciÃ³n en Redis con un unico MGET (los valores guardados nunca son vacios)
         try:
-            async with self.redis.pipeline(transaction=False) as pipe:
-                for key, _ in keys_to_check:
-                    pipe.exists(key)
-                    
-                pipe_results = await pipe.execute()
+            keys = [key for key, _ in keys_to_check]
+            values = await self.redis.mget(keys)
+            
+            for key, value in zip(keys, values):
+                exists = value is not None
+                if exists:
+                    self.local_cache.set(key, True)
+                results[key] = exists
                 
-                for (key, pick), exists in zip(keys_to_check, pipe_results):
-                    if exists:
-                        await self.local_cache.set(key, True)
-                    results[key] = bool(exists)
-                    
-                return results
+            return results
                 
         except Exception as e:
-            logger.error(f"Error en verificaciÃ³n batch: {e}")
+            logger.error("Error en verificaciÃ³n batch: %s", e)
             return {key: False for key, _ in keys_to_check}
 
     async def mark_picks_sent_batch(self, picks: List[dict]) -> bool:
         """Guarda picks en Redis asegurando que la TTL sea la fecha del evento."""
         try:
-            tz_spain = pytz_timezone("Europe/Madrid")
-            current_time = datetime.now(UTC)  # Asegurar que la comparaciÃ³n sea en UTC
+            current_time = datetime.now(timezone.utc)  # Asegurar que la comparaciÃ³n sea en UTC
 
-            async with self.redis.pipeline(transaction=True) as pipe:
-                for pick in picks:
-                    if not self._validate_pick_data(pick):
-                        continue
+            keys, ttls = [], []
+            for pick in picks:
+                if not self._validate_pick_data(pick):
+                    continue
 
-                    # Obtener la fecha del evento en UTC y convertirla a segundos
-                    event_time = int(str(pick['time'])[:-3])  # Eliminar milisegundos
-                    
-                    # Calcular el tiempo restante hasta el evento
-                    ttl = max(60, event_time - int(current_time.timestamp()))  # MÃ­nimo 60s
+                # Obtener la fecha del evento en UTC y convertirla a segundos
+                event_time = int(pick['time']) // 1000  # Eliminar milisegundos
+                
+                # Calcular el tiempo restante hasta el evento
+                ttl = max(60, event_time - int(current_time.timestamp()))  # MÃ­nimo 60s
 
-                    if ttl <= 0:
-                        continue  # Si el evento ya pasÃ³, no guardarlo
+                if ttl <= 0:
+                    continue  # Si el evento ya pasÃ³, no guardarlo
 
-                    key = self._get_complete_key(pick)
-                    pipe.setex(key, ttl, time.time())  # Guardar en Redis con TTL exacto
-                    
-                    await self.local_cache.set(key, True)
-                    
-                await pipe.execute()
-                return True
+                key = self._get_complete_key(pick)
+                keys.append(key)
+                ttls.append(ttl)
+                
+                self.local_cache.set(key, True)
+                
+            if keys:
+                await self._setex_many(keys=keys, args=[*ttls, time.time()])
+            return True
 
         except Exception as e:
-            logger.error(f"Error en guardado batch: {e}")
+            logger.error("Error en guardado batch: %s", e)
             return False
 
 
@@ -969,20 +1122,19 @@ class RedisHandler:
         """Normaliza strings para asegurar consistencia en las claves"""
         if not text:
             return ''
-        # Eliminar caracteres especiales y normalizar espacios
-        clean_text = re.sub(r'[^\w\s]', '', str(text).lower())
-        return ' '.join(clean_text.split())
+        # Eliminar caracteres especiales (tabla de str.translate) y normalizar espacios
+        return ' '.join(str(text).lower().translate(_STRIP_PUNCTUATION).split())
 
     def _get_spain_time(self, timestamp: int) -> datetime:
         """Convierte un timestamp a datetime en zona horaria de EspaÃ±a"""
-        tz_spain = pytz_timezone("Europe/Madrid")
+        tz_spain = _TZ_MADRID
         try:
             # Convertir el timestamp eliminando los Ãºltimos 3 dÃ­gitos
-            timestamp_seconds = int(str(timestamp)[:-3])
+            timestamp_seconds = int(timestamp) // 1000
             # Convertir a datetime en UTC y luego a hora de EspaÃ±a
-            return datetime.fromtimestamp(timestamp_seconds, tz=UTC).astimezone(tz_spain)
+            return datetime.fromtimestamp(timestamp_seconds, tz=timezone.utc).astimezone(tz_spain)
         except Exception as e:
-            logger.error(f"Error convirtiendo timestamp: {e}")
+            logger.error("Error convirtiendo timestamp: %s", e)
             return datetime.now(tz_spain)
     
     def _validate_pick_data(self, pick: dict) -> bool:
@@ -990,7 +1142,7 @@ class RedisHandler:
         required_fields = ['teams', 'time', 'type', 'target_bookmaker']
         for field in required_fields:
             if not pick.get(field):
-                logger.warning(f"Campo requerido faltante: {field}")
+                logger.warning("Campo requerido faltante: %s", field)
                 return False
         if not pick['type'].get('type'):
             logger.warning("Campo type.type faltante")
@@ -1001,7 +1153,7 @@ class RedisHandler:
         """Genera una clave base mÃ¡s robusta para Redis"""
         team1 = self._normalize_string(pick['teams'][0])
         team2 = self._normalize_string(pick['teams'][1])
-        event_time = str(int(str(pick['time'])[:-3]))
+        event_time = str(int(pick['time']) // 1000)
         tournament = self._normalize_string(pick.get('tournament', ''))
         return f"{team1}:{team2}:{event_time}:{tournament}"
     
@@ -1009,24 +1161,36 @@ class RedisHandler:
         """Genera la llave completa incluyendo el mercado y el bookmaker"""
         return f"{base_key}:{market_type}:{bookmaker}"
 
+    def _get_event_key(self, pick: dict) -> str:
+        """Prefijo 'equipo1:equipo2:time' comun a la clave del pick y a las opuestas (cacheado en el pick)"""
+        event_key = pick.get('_event_key')
+        if event_key is None:
+            teams = pick.get('teams', ['', ''])
+            event_key = pick['_event_key'] = f"{teams[0]}:{teams[1]}:{pick.get('time', '')}"
+        return event_key
+
     def _get_complete_key(self, pick: dict) -> str:
         """Genera la clave Ãºnica para un pick."""
+        complete_key = pick.get('_complete_key')
+        if complete_key is not None:
+            return complete_key
         try:
-            teams = pick.get('teams', ['', ''])
-            event_time = str(pick.get('time', ''))
             type_dict = pick.get('type', {})  # Primero obtenemos el diccionario type
             market_type = type_dict.get('type', '').lower()
             variety = type_dict.get('variety', '').lower()
             bookmaker = pick.get('target_bookmaker', '')
             
-            return f"{teams[0]}:{teams[1]}:{event_time}:{market_type}:{variety}:{bookmaker}"
+            complete_key = f"{self._get_event_key(pick)}:{market_type}:{variety}:{bookmaker}"
         except Exception as e:
-            self.logger.error(f"Error generando clave completa: {e}")
+            self.logger.error("Error generando clave completa: %s", e)
             return ""
+        # Se calcula una vez por pick (is_pick_sent, mark_picks_sent, worker)
+        pick['_complete_key'] = complete_key
+        return complete_key
         
 
       
-    def get_market_opposites(self, market_type: str) -> List[str]:
+    def get_market_opposites(self, market_type: str) -> Tuple[str, ...]:
         
         try:
             # Si recibimos un diccionario (pick completo), extraemos el tipo de mercado
@@ -1038,68 +1202,61 @@ class RedisHandler:
                 market_type = str(market_type).lower()
                 
             # Obtenemos el opuesto del diccionario
-            opposite = self.opposite_markets.get(market_type, [])
-            
-            # Convertimos a lista si es un string
-            if isinstance(opposite, str):
-                return [opposite]
-            
-            return opposite if opposite else []
+            return self.opposite_markets.get(market_type, ())
             
         except Exception as e:
-            self.logger.error(f"Error obteniendo mercados opuestos para {market_type}: {e}")
-            return []
+            self.logger.error("Error obteniendo mercados opuestos para %s: %s", market_type, e)
+            return ()
 
     def _get_opposite_keys(self, pick: dict) -> List[str]:
         """Genera las claves para los mercados opuestos de un pick."""
         try:
-            teams = pick.get('teams', ['', ''])
-            event_time = str(pick.get('time', ''))
-            # Accedemos correctamente a type.type y type.variety
-            type_dict = pick.get('type', {})  # Primero obtenemos el diccionario type
-            market_type = type_dict.get('type', '').lower()
-            variety = type_dict.get('variety', '').lower()
+            market_type = pick.get('type', {}).get('type', '').lower()
             bookmaker = pick.get('target_bookmaker', '')
-            
-            # Base comÃºn para todas las claves
-            base = f"{teams[0]}:{teams[1]}:{event_time}"
-            
-            # Obtenemos los mercados opuestos
-            opposite_types = self.get_market_opposites(market_type)
+            base = self._get_event_key(pick)
             
             # Generamos las claves completas para cada mercado opuesto
-            return [f"{base}:{opp_type}:{bookmaker}" for opp_type in opposite_types]
+            return [f"{base}:{opp_type}:{bookmaker}" for opp_type in self.get_market_opposites(market_type)]
             
         except Exception as e:
-            self.logger.error(f"Error generando claves opuestas: {e}")
+            self.logger.error("Error generando claves opuestas: %s", e)
             return []
     
     async def is_any_market_stored(self, pick: dict) -> bool:
         """Verifica si un pick o su mercado opuesto ya estÃ¡ almacenado en Redis."""
-        try:
-            # Obtener clave principal
-            original_key = self._get_complete_key(pick)
-            
-            # Verificar si ya fue enviado (cachÃ© local o Redis)
-            if self.local_cache.get(original_key) or await self.redis.exists(original_key):
-                return True
+        results = await self.is_any_market_stored_batch([pick])
+        return results.get(0, False)
 
-            # Obtener mercado opuesto basado en el tipo de mercado
-            market_type = pick['type']['type'].lower()
-            opposite_markets = self.get_market_opposites(market_type)  # Solo pasamos el string
+    async def is_any_market_stored_batch(self, picks: List[dict]) -> Dict[int, bool]:
+        """
+        Verifica varios picks (clave principal + mercados opuestos) con un unico MGET.
+        
+        Returns:
+            Dict[int, bool]: indice del pick en `picks` -> ya almacenado
+        """
+        results = {}
+        pending = {}  # indice -> claves a consultar en Redis
+        try:
+            for idx, pick in enumerate(picks):
+                keys = [self._get_complete_key(pick), *self._get_opposite_keys(pick)]
+                # Cache local primero: si cualquiera esta, no hace falta ir a Redis
+                if any(self.local_cache.get(key) for key in keys):
+                    results[idx] = True
+                else:
+                    pending[idx] = keys
 
-            # Verificar si alguno de los mercados opuestos ya estÃ¡ en Redis
-            base_key = f"{pick['teams'][0]}:{pick['teams'][1]}:{pick['time']}"
-            for opp_market in opposite_markets:
-                opp_key = f"{base_key}:{opp_market}:{pick['target_bookmaker']}"
-                if self.local_cache.get(opp_key) or await self.redis.exists(opp_key):
-                    return True
+            if pending:
+                unique_keys = list(dict.fromkeys(key for keys in pending.values() for key in keys))
+                values = await self.redis.mget(unique_keys)
+                stored = {key for key, value in zip(unique_keys, values) if value is not None}
+                for idx, keys in pending.items():
+                    results[idx] = any(key in stored for key in keys)
 
-            return False
+            return results
 
         except Exception as e:
-            self.logger.error(f"Error verificando mercados en Redis: {e}")
-            return False
+            self.logger.error("Error verificando mercados en Redis: %s", e)
+            return {idx: results.get(idx, False) for idx in range(len(picks))}
 
 
 
@@ -1107,25 +1264,16 @@ class RedisHandler:
         """Guarda el pick y sus mercados equivalentes en Redis."""
         try:
             key = self._get_complete_key(pick)
-            market_type = pick['type']['type'].lower()
-            opposite_markets = self.get_market_opposites(market_type)  # Usar string, no pick completo
-
-            async with self.redis.pipeline(transaction=True) as pipe:
-                pipe.setex(key, ttl, time.time())
-                await self.local_cache.set(key, True)
 
-                # Guardar tambiÃ©n los mercados equivalentes
-                base_key = f"{pick['teams'][0]}:{pick['teams'][1]}:{pick['time']}"
-                for opp_market in opposite_markets:
-                    opp_key = f"{base_key}:{opp_market}:{pick['target_bookmaker']}"
-                    pipe.setex(opp_key, ttl, time.time())
-                    await self.local_cache.set(opp_key, True)
-
-                await pipe.execute()
-                return True
+            # Guardar tambiÃ©n los mercados equivalentes (sin MULTI/EXEC: cada clave es independiente)
+            keys = [key, *self._get_opposite_keys(pick)]
+            await self._setex_many(keys=keys, args=[*([ttl] * len(keys)), time.time()])
+            for stored_key in keys:
+                self.local_cache.set(stored_key, True)
+            return True
 
         except Exception as e:
-            self.logger.error(f"Error almacenando mercados en Redis: {e}")
+            self.logger.error("Error almacenando mercados en Redis: %s", e)
             return False
 
 
@@ -1135,6 +1283,38 @@ class RedisHandler:
             await self.redis.close()
     
 # Formateo del mensaje
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Reescrituras de dominio de ajustar_dominio (bet365 va aparte: tambien cambia la
+# ruta). En la alternancia el patron de sportswidget va antes que el de versus
+_DOMAIN_REWRITES = {
+    "sports.betway.com/en/sports": "sports.betway.es/es/sports",
+    "sports.bwin.com/en/": "sports.bwin.es/es/",
+    "sportswidget.versus.es/sports": "www.versus.es/apuestas/sports",
+    "versus.es/sports": "www.versus.es/apuestas/sports",
+    "pokerstars.uk/": "pokerstars.es/",
+}
+_DOMAIN_RE = re.compile('|'.join(map(re.escape, _DOMAIN_REWRITES)))
+
+
+def _replace_domain(match: re.Match) -> str:
+    return _DOMAIN_REWRITES[match.group(0)]
+
+
+# Equivalentes a html.escape(quote=False / quote=True) en una sola pasada de str.translate
+_HTML_ESCAPE_TBL = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+_HTML_ESCAPE_QUOTE_TBL = str.maketrans({
+    '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#x27;'
+})
+
+
+@functools.lru_cache(maxsize=2048)
+def _madrid_utc_offset(utc_hour: int) -> int:
+    """Desfase en segundos de Europe/Madrid para una hora UTC (los cambios DST caen en hora en punto)."""
+    moment = datetime.fromtimestamp(utc_hour * 3600, tz=timezone.utc).astimezone(_TZ_MADRID)
+    return int(moment.utcoffset().total_seconds())
+
+
 class MessageFormatter:
     def __init__(self):
         self._cache_ttl = 60
@@ -1168,11 +1348,22 @@ class MessageFormatter:
             '(SECOND_YELLOW_IS_YELLOW_AND_RED_CARD)': ''
         }
 
-        self.words_to_remove = {
+        self.words_to_remove = frozenset({
             'point', 'points', 'overall', 'regular', 'overtime', 
             'goal', 'goals', 'regulartime', 'set', 'time', 'total',
-            'game', 'games', 'match', 'matches', '(SECOND_YELLOW_IS_YELLOW_AND_RED_CARD)', 'total'
+            'game', 'games', 'match', 'matches', '(second_yellow_is_yellow_and_red_card)'
+        })
+        # Patrones de clean_text compilados una vez (antes se recompilaba el de
+        # palabras y se hacian ~30 str.replace por cada texto)
+        words_to_remove = '|'.join(map(re.escape, self.words_to_remove))
+        self._remove_words_re = re.compile(rf'\b({words_to_remove})\b')
+        self._lower_replacements = {
+            old.lower(): new.lower() for old, new in self.replacements.items()
         }
+        # Claves mas largas primero para que 'win1retx' gane a 'win1'
+        self._replacements_re = re.compile('|'.join(
+            map(re.escape, sorted(self._lower_replacements, key=len, reverse=True))
+        ))
         self.emoji_cache = {
             'football': 'âš½ï¸',
             'basketball': 'ðŸ€',
@@ -1198,13 +1389,26 @@ class MessageFormatter:
             "{date}\n\n"
             "{link}"
         )
+        # Plantilla troceada una sola vez en (literal, campo): format_message une los
+        # segmentos sin volver a parsear el formato en cada pick
+        self._template_segments = tuple(
+            (literal, field)
+            for literal, field, _, _ in string.Formatter().parse(self.message_template)
+        )
+
+        # Funciones puras que se repiten mucho dentro de un lote (mismos equipos,
+        # torneos, horas y enlaces): memoizadas por instancia con LRU acotado
+        self.safe_escape = functools.lru_cache(maxsize=4096)(self.safe_escape)
+        self.clean_text = functools.lru_cache(maxsize=4096)(self.clean_text)
+        self.format_date = functools.lru_cache(maxsize=4096)(self.format_date)
+        self.ajustar_dominio = functools.lru_cache(maxsize=4096)(self.ajustar_dominio)
         
     # Escapar caracteres especiales
     def safe_escape(self, text):
         if text is None:
             return ''
         text = str(text).strip()
-        return html.escape(text, quote=False)
+        return text.translate(_HTML_ESCAPE_TBL)
 
     def _get_cache_key(self, apuesta: dict, contrapartida: dict, profit: float) -> str:
         return f"{apuesta['teams'][0]}:{apuesta['teams'][1]}:{apuesta['time']}:{profit}"
@@ -1219,22 +1423,20 @@ class MessageFormatter:
         # Convertir a minÃºsculas y eliminar espacios extra
         text = str(text).strip().lower()
 
-        # Definir patrÃ³n para palabras a eliminar (individuales o compuestas)
-        words_to_remove = '|'.join(map(re.escape, self.words_to_remove))
-        pattern = rf'\b({words_to_remove})\b'
-
-        # Eliminar palabras no deseadas
-        text = re.sub(pattern, '', text)
+        # Eliminar palabras no deseadas (patron precompilado en __init__)
+        text = self._remove_words_re.sub('', text)
 
-        # Aplicar reemplazos
-        for old, new in self.replacements.items():
-            text = text.replace(old.lower(), new.lower())
+        # Aplicar todos los reemplazos en una sola pasada
+        text = self._replacements_re.sub(self._replace_match, text)
 
         # Eliminar espacios extra generados por las eliminaciones
         text = ' '.join(text.split())
 
         # Escapar caracteres especiales para Telegram HTML
-        return html.escape(text, quote=False)
+        return text.translate(_HTML_ESCAPE_TBL)
+
+    def _replace_match(self, match: re.Match) -> str:
+        return self._lower_replacements[match.group(0)]
 
 
     def format_date(self, timestamp: int) -> str:
@@ -1243,36 +1445,31 @@ class MessageFormatter:
                 return ""
                 
             # Convertimos el timestamp
-            seconds = int(str(timestamp)[:-3])
-            
-            # Creamos el objeto datetime en UTC
-            event_time = datetime.fromtimestamp(seconds, UTC)
+            seconds = int(timestamp) // 1000
             
-            # Convertimos a la zona horaria de EspaÃ±a
-            tz_spain = pytz.timezone("Europe/Madrid")
-            event_time_spain = event_time.astimezone(tz_spain)
+            # Hora local = UTC + desfase de Madrid (cacheado por hora UTC), sin
+            # crear datetimes ni resolver las reglas DST en cada llamada
+            local = seconds + _madrid_utc_offset(seconds // 3600)
+            tm = time.gmtime(local)
 
-            # Formateamos cada componente por separado
-            fecha = html.escape(event_time_spain.strftime('%d/%m/%Y'), quote=False)
-            hora = html.escape(event_time_spain.strftime('%H:%M'), quote=False)
-            dia = html.escape(self.dias[event_time_spain.weekday()], quote=False)
+            # Formateamos cada componente por separado (solo digitos y '/', no hay que escapar)
+            fecha = f"{tm.tm_mday:02d}/{tm.tm_mon:02d}/{tm.tm_year}"
+            hora = f"{tm.tm_hour:02d}:{tm.tm_min:02d}"
+            dia = self.dias[tm.tm_wday].translate(_HTML_ESCAPE_TBL)
 
             # Devolvemos el formato sin necesidad de escapar parÃ©ntesis
             return f"ðŸ“… {fecha} ({dia} {hora})"
             
         except Exception as e:
-            self.logger.error(f"Error formatting date: {e}")
+            self.logger.error("Error formatting date: %s", e)
             return ""
 
     def get_stake(self, profit: float, contrapartida_bk: str) -> str:
-
-        logger.info(f"Analizando casa de apuestas: '{contrapartida_bk}' | Valor original: {repr(contrapartida_bk)}")
-        
-        contrapartida_bk = re.sub(r'\s+', '', str(contrapartida_bk).lower().strip())
-        logger.info(f"Casa normalizada: '{contrapartida_bk}'")
+        # Normalizar una vez (patron precompilado); sin logs por pick en el camino normal
+        original_bk = contrapartida_bk
+        contrapartida_bk = _WHITESPACE_RE.sub('', str(contrapartida_bk).lower())
 
         if contrapartida_bk == 'pinnaclesports':
-            logger.info("Coincide con reglas de Pinnacle")
             # Rangos de Pinnacle son mÃ¡s estrictos
             if profit < -1:
                 return ""
@@ -1284,8 +1481,7 @@ class MessageFormatter:
                 return "ðŸŸ¡"
             return "ðŸŸ¢"
             
-        elif re.search(r'bet\s*365', contrapartida_bk, re.IGNORECASE):  # ComparaciÃ³n mÃ¡s flexible
-            logger.info("Coincide con reglas de Bet365")
+        elif 'bet365' in contrapartida_bk:  # Sin espacios, equivale a bet\s*365
             # Bet365 permite rangos mÃ¡s amplios
             if profit >= 2:
                 return "ðŸŸ " 
@@ -1293,12 +1489,11 @@ class MessageFormatter:
                 return ""  
         
         else:
-            logger.warning(
-                f"Casa no reconocida:\n"
-                f"Original: '{contrapartida_bk}'\n"
-                f"Normalizada: '{contrapartida_bk}'\n"
-                f"Hex: {contrapartida_bk.encode('utf-8').hex()}"
-            )
+            if logger.isEnabledFor(logging.WARNING):
+                logger.warning(
+                    "Casa no reconocida:\nOriginal: %r\nNormalizada: '%s'\nHex: %s",
+                    original_bk, contrapartida_bk, contrapartida_bk.encode('utf-8').hex()
+                )
 
         return ""
     
@@ -1341,32 +1536,26 @@ class MessageFormatter:
                 # Convertimos la ruta a mayÃºsculas manteniendo el dominio igual
                 return f"{domain}.es{path.upper()}"
         
-        # Si es un enlace de betway
-        elif "betway" in url:
-            # Reemplazamos el dominio .com/en por .es/es
-            url = url.replace("sports.betway.com/en/sports", "sports.betway.es/es/sports")
-            
-        # Si es un enlace de bwin
-        elif "bwin" in url:
-            url = url.replace("sports.bwin.com/en/", "sports.bwin.es/es/")
-            
-        # Si es un enlace de versus (con sportswidget)
-        elif "sportswidget.versus.es" in url:
-            url = url.replace("sportswidget.versus.es/sports", "www.versus.es/apuestas/sports")
-        
-        # Si es un enlace de versus (sin sportswidget)
-        elif "versus.es/sports" in url:
-            url = url.replace("versus.es/sports", "www.versus.es/apuestas/sports")
+            return url
 
-        # Si es un enlace de PokerStars
-        elif "pokerstars" in url:
-            url = url.replace("pokerstars.uk/", "pokerstars.es/")
-            
-        return url
+        # Resto de casas: una sola pasada de regex con todas las reescrituras
+        return _DOMAIN_RE.sub(_replace_domain, url)
     
     
+    def _render_template(self, values: Dict[str, str]) -> str:
+        """Equivale a message_template.format(**values) usando los segmentos precalculados."""
+        return ''.join([
+            literal if field is None else literal + values[field]
+            for literal, field in self._template_segments
+        ])
+
     async def format_message(self, apuesta: dict, contrapartida: dict, profit: float) -> str:
         try:
+            # Atributos y globales usados varias veces, resueltos una sola vez
+            get = apuesta.get
+            clean_text = self.clean_text
+            esc_tbl = _HTML_ESCAPE_TBL
+
             # Primero verificamos la cachÃ©
             cache_key = self._get_cache_key(apuesta, contrapartida, profit)
             cached = self._message_cache.get(cache_key)
@@ -1374,7 +1563,7 @@ class MessageFormatter:
                 return cached
 
             # Validamos la fecha
-            formatted_date = self.format_date(apuesta.get('time', 0))
+            formatted_date = self.format_date(get('time', 0))
             if not formatted_date:
                 return ""
 
@@ -1393,87 +1582,82 @@ class MessageFormatter:
 
             # Procesamos el type_info
             type_parts = []
-            type_dict = apuesta.get('type', {})
+            type_dict = get('type', {})
 
-            for key in ['type', 'condition', 'variety', 'base', 'game', 'period']:
+            for key in ('type', 'condition', 'variety', 'base', 'game', 'period'):
                 value = type_dict.get(key, '')
                 if value:
                     # Si el campo es 'condition', tratamos especÃ­ficamente los caracteres conflictivos
                     if key == 'condition':
-                        cleaned_value = self.clean_text(str(value))  # Limpieza bÃ¡sica
+                        cleaned_value = clean_text(str(value))  # Limpieza bÃ¡sica
                         # Eliminar escapado de puntos
                         cleaned_value = cleaned_value.replace("\\.", ".")
                     else:
                         # Limpia como cualquier otra parte
-                        cleaned_value = self.clean_text(str(value))
+                        cleaned_value = clean_text(str(value))
                     
                     if cleaned_value:
                         type_parts.append(cleaned_value)
 
             # Combina las partes y convierte a mayÃºsculas
             type_info = ' '.join(type_parts).upper()
-            type_info_fixed = (
-                type_info
-                .replace("\\.", ".")
-                .replace(".\\", ".")
-                .replace("\\-", "-")
-                .replace("-\\", "-")
-                .replace("\\(", "(")
-                .replace("(\\", "(")
-                .replace("\\)", ")")
-                .replace(")\\", ")")
-                .replace("\\", "")
-
-            )
+            # Quitar cualquier barra de escapado (los reemplazos encadenados
+            # por signo de puntuacion equivalian a eliminar todas las '\\')
+            type_info_fixed = type_info.replace("\\", "")
 
 
 
             
-            team1 = self.clean_text(apuesta.get('teams', ['', ''])[0]).title()
-            team2 = self.clean_text(apuesta.get('teams', ['', ''])[1]).title()
-            teams = f"{self.emoji_cache.get(apuesta.get('sport_id', '').lower(), '')} <code>{team1}</code> vs <code>{team2}</code>"
-
-            tournament = f"ðŸ† {self.clean_text(apuesta.get('tournament', '')).title()} ({self.clean_text(apuesta.get('sport_id', '')).title()})"
-            tournament_fixed = (
-                tournament
-                .replace("\\.", ".")
-                .replace(".\\", ".")
-                .replace("\\-", "-")
-                .replace("-\\", "-")
-                .replace("\\(", "(")
-                .replace("(\\", "(")
-                .replace("\\)", ")")
-                .replace(")\\", ")")
-                .replace("\\", "")
-            )
+            teams_pair = get('teams', ['', ''])
+            team1 = clean_text(teams_pair[0]).title()
+            team2 = clean_text(teams_pair[1]).title()
+            sport_id = get('sport_id', '')
+            teams = f"{self.emoji_cache.get(sport_id.lower(), '')} <code>{team1}</code> vs <code>{team2}</code>"
+
+            tournament = f"ðŸ† {clean_text(get('tournament', '')).title()} ({clean_text(sport_id).title()})"
+            tournament_fixed = tournament.replace("\\", "")
             
-            link_original = apuesta.get('preferred_nav', {}).get('links', [{}])[0].get('link', {}).get('url', '')
+            link_original = get('preferred_nav', {}).get('links', [{}])[0].get('link', {}).get('url', '')
             link_ajustado = self.ajustar_dominio(link_original)
 
 
             # Construimos el mensaje con el template
-            result = self.message_template.format(
-                stake=html.escape(str(stake), quote=False),
-                type_info=html.escape(str(type_info_fixed), quote=False),
-                odds=html.escape(str(apuesta.get('value', '')), quote=False),
-                min_odds=html.escape(str(min_odds), quote=False),  
+            result = self._render_template(dict(
+                stake=str(stake).translate(esc_tbl),
+                type_info=str(type_info_fixed).translate(esc_tbl),
+                odds=str(get('value', '')).translate(esc_tbl),
+                min_odds=str(min_odds).translate(esc_tbl),
                 teams=teams,
-                tournament=html.escape(str(tournament_fixed), quote=False),
+                tournament=str(tournament_fixed).translate(esc_tbl),
                 date=formatted_date,  # Ya estÃ¡ escapado en format_date
-                link=f'ðŸ”— <a href="{html.escape(link_ajustado, quote=True)}">{html.escape(link_ajustado, quote=False)}</a>'
-                )
+                link=f'ðŸ”— <a href="{link_ajustado.translate(_HTML_ESCAPE_QUOTE_TBL)}">{link_ajustado.translate(esc_tbl)}</a>'
+                ))
 
             if result:
-                await self._message_cache.set(cache_key, result)
+                self._message_cache.set(cache_key, result)
                 
             return result
 
         except Exception as e:
-            self.logger.error(f"Error al formatear el mensaje: {e}", exc_info=True)
+            self.logger.error("Error al formatear el mensaje: %s", e, exc_info=True)
             return ""
            
         
 # Envio por Telegram
+# Mapeo de canales a nombres para logging mÃ¡s descriptivo
+_CHANNEL_NAMES = types.MappingProxyType({
+    -1002294438792: "retabet_apuestas",
+    -1002482485894: "bet365",
+    -1002489999052: "winamax_es",
+    -1002360901387: "yaasscasino",
+    -1002431708758: "bwin",
+    -1002359893431: 'sportium',
+    #-1002267476497: 'caliente',
+    -1002446566564: 'betway',
+    -1002571244724: 'versus'
+})
+
+
 class TelegramSender:
     def __init__(self, tokens: List[str]):
         self.bots = []
@@ -1481,10 +1665,16 @@ class TelegramSender:
             bot = Bot(token=token)
             self.bots.append(bot)
         
-        self.current_bot_index = 0
-        self.message_queue = asyncio.PriorityQueue()
+        # Rotacion round-robin: el bot activo es siempre _bot_ring[0]; el id
+        # (prefijo del token) se calcula una vez en lugar de en cada intento
+        self._bot_ring = collections.deque(self.bots)
+        self._bot_ids = {bot: bot.token.split(':')[0] for bot in self.bots}
         self.retry_delay = 1
         self.max_retries = 3
+        # Cola de reintentos: un deque por prioridad (1 + reintentos) en vez de un
+        # heap; enqueue/dequeue O(1) y un unico Event para despertar al consumidor
+        self._queues = [collections.deque() for _ in range(self.max_retries + 2)]
+        self._not_empty = asyncio.Event()
         self.sending_semaphore = asyncio.Semaphore(30)
         self.failed_messages = {}
         self.retry_delays = {
@@ -1498,41 +1688,58 @@ class TelegramSender:
         self._bot_locks = {bot: asyncio.Lock() for bot in self.bots}
         self._rate_limit_window = 1.0
         self._messages_per_window = 30
-        self._message_timestamps = collections.deque(maxlen=self._messages_per_window)
+        # Token bucket por bot: Telegram limita por token, asi cada bot tiene
+        # su propia ventana de 30 msg/s en lugar de compartir una global
+        self._limiters = {
+            bot: AsyncLimiter(self._messages_per_window, self._rate_limit_window)
+            for bot in self.bots
+        }
 
-    async def _enforce_rate_limit(self):
-        current_time = time.time()
-        
-        while (self._message_timestamps and 
-               current_time - self._message_timestamps[0] > self._rate_limit_window):
-            self._message_timestamps.popleft()
-        
-        if len(self._message_timestamps) >= self._messages_per_window:
-            wait_time = self._rate_limit_window - (current_time - self._message_timestamps[0])
-            if wait_time > 0:
-                await asyncio.sleep(wait_time)
-        
-        self._message_timestamps.append(current_time)
+    async def _enforce_rate_limit(self, bot: Bot):
+        await self._limiters[bot].acquire()
 
-    
-    async def process_message_queue(self):
+    def enqueue(self, priority: int, item: Tuple[int, str, int]) -> None:
+        """Encola (channel_id, message, retries); menor prioridad sale antes."""
+        bucket = min(max(priority, 0), len(self._queues) - 1)
+        self._queues[bucket].append((priority, item))
+        self._not_empty.set()
+
+    async def _dequeue(self) -> Tuple[int, Tuple[int, str, int]]:
         while True:
-            try:
-                priority, (channel_id, message, retries) = await self.message_queue.get()
-                
-                if retries >= self.max_retries:
-                    logger.error(f"Max retries reached for message to channel {channel_id}")
-                    continue
+            for bucket in self._queues:
+                if bucket:
+                    return bucket.popleft()
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+    def _drain(self, batch: list, limit: int) -> None:
+        """Saca sin bloquear hasta completar `limit` mensajes, por prioridad."""
+        for bucket in self._queues:
+            while bucket and len(batch) < limit:
+                batch.append(bucket.popleft())
+
+    async def _send_queued(self, priority: int, channel_id: int, message: str, retries: int):
+        if retries >= self.max_retries:
+            logger.error(f"Max retries reached for message to channel {channel_id}")
+            return
 
-                success = await self.send_message_optimized(channel_id, message)
-                
-                if not success:
-                    # Reintentar con menor prioridad
-                    await self.message_queue.put((priority + 1, (channel_id, message, retries + 1)))
+        success = await self.send_message_optimized(channel_id, message)
 
-                     
-                
-                await asyncio.sleep(0.05)
+        if not success:
+            # Reintentar con menor prioridad
+            self.enqueue(priority + 1, (channel_id, message, retries + 1))
+
+    async def process_message_queue(self):
+        while True:
+            try:
+                # Bloquea hasta el primer mensaje y agrupa los que ya esten listos
+                # (hasta una ventana de rate limit) para enviarlos concurrentemente
+                batch = [await self._dequeue()]
+                self._drain(batch, self._messages_per_window)
+                await asyncio.gather(*[
+                    self._send_queued(priority, channel_id, message, retries)
+                    for priority, (channel_id, message, retries) in batch
+                ])
             except Exception as e:
                 logger.error(f"Error processing message queue: {e}")
 
@@ -1540,20 +1747,7 @@ class TelegramSender:
         start_time = time.time()
         tried_bots = set()
         
-        # Mapeo de canales a nombres para logging mÃ¡s descriptivo
-        channel_names = {
-            -1002294438792: "retabet_apuestas",
-            -1002482485894: "bet365",
-            -1002489999052: "winamax_es",
-            -1002360901387: "yaasscasino",
-            -1002431708758: "bwin",
-            -1002359893431: 'sportium',
-            #-1002267476497: 'caliente',
-            -1002446566564: 'betway',
-            -1002571244724: 'versus'
-        }
-        
-        channel_name = channel_names.get(channel_id, str(channel_id))
+        channel_name = _CHANNEL_NAMES.get(channel_id, str(channel_id))
         max_attempts_per_bot = 3
         
         while len(tried_bots) < len(self.bots):
@@ -1568,16 +1762,16 @@ class TelegramSender:
                     return False
 
                 # Obtener el prÃ³ximo bot a usar
-                bot = self.bots[self.current_bot_index]
-                bot_id = bot.token.split(':')[0]
+                bot = self._bot_ring[0]
+                bot_id = self._bot_ids[bot]
 
                 # Si ya hemos intentado con este bot, pasar al siguiente
                 if bot_id in tried_bots:
-                    self.current_bot_index = (self.current_bot_index + 1) % len(self.bots)
+                    self._bot_ring.rotate(-1)
                     continue
 
                 # Aplicar rate limit
-                await self._enforce_rate_limit()
+                await self._enforce_rate_limit(bot)
 
                 # Intentar enviar el mensaje
                 await bot.send_message(
@@ -1602,7 +1796,7 @@ class TelegramSender:
                 )
                 
                 # Cambiar al siguiente bot
-                self.current_bot_index = (self.current_bot_index + 1) % len(self.bots)
+                self._bot_ring.rotate(-1)
                 
                 # Si hemos intentado con todos los bots, esperar un poco
                 if len(tried_bots) == len(self.bots):
@@ -1626,7 +1820,7 @@ class TelegramSender:
                     f"- Canal: {channel_name}"
                 )
                 tried_bots.add(bot_id)
-                self.current_bot_index = (self.current_bot_index + 1) % len(self.bots)
+                self._bot_ring.rotate(-1)
 
             except Exception as e:
                 logger.error(
@@ -1636,7 +1830,7 @@ class TelegramSender:
                     f"- Error: {str(e)}"
                 )
                 tried_bots.add(bot_id)
-                self.current_bot_index = (self.current_bot_index + 1) % len(self.bots)
+                self._bot_ring.rotate(-1)
                 await asyncio.sleep(1)
 
         # Si llegamos aquÃ­, es que no pudimos enviar con ningÃºn bot
@@ -1655,6 +1849,11 @@ class TelegramSender:
         for bot in self.bots:
             await bot.session.close()    
 
+# Pick normalizado una unica vez al entrar en el pipeline: los workers reciben
+# las dos patas ya separadas y no repiten las comprobaciones de forma
+PickTuple = collections.namedtuple('PickTuple', 'prong1 prong2 profit raw')
+
+
 # Logica principal del bot
 class BettingBot:
     def __init__(self, config: BotConfig):
@@ -1667,10 +1866,11 @@ class BettingBot:
         # ConfiguraciÃ³n bÃ¡sica y logging
         self._initialize_base_config(config)
         
-        # OptimizaciÃ³n de workers basada en CPU
-        self.num_validation_workers = max(multiprocessing.cpu_count() * 8, 32)
-        self.num_redis_workers = max(multiprocessing.cpu_count() * 16, 64)
-        self.num_telegram_workers = max(multiprocessing.cpu_count() * 12, 48)
+        # Workers fijos desde la configuracion: son corrutinas limitadas por I/O,
+        # escalar con el numero de CPUs solo anadia contencion en el scheduler
+        self.num_validation_workers = config.VALIDATION_WORKERS
+        self.num_redis_workers = config.REDIS_WORKERS
+        self.num_telegram_workers = config.TELEGRAM_WORKERS
         
         # Inicializar servicios en orden de dependencia
         self._initialize_core_services(config)
@@ -1679,12 +1879,14 @@ class BettingBot:
         self._initialize_messaging_services(config) 
 
         # InicializaciÃ³n para multiprocesamiento
-        self.num_processors = multiprocessing.cpu_count()
+        self.num_processors = os.cpu_count() or 1
         
         # Colas para procesamiento paralelo
         self.validation_queue = asyncio.Queue(maxsize=10000)
         self.redis_queue = asyncio.Queue(maxsize=10000)
         self.telegram_queue = asyncio.Queue(maxsize=10000)
+        self.redis_batch_size = 64  # Picks maximos por ronda de Redis en cada redis_worker
+        self.worker_batch_size = 32  # Elementos maximos que drena un worker por despertar
 
         # Inicializar semÃ¡foro para procesamiento de picks
         self.processing_semaphore = asyncio.Semaphore(config.CONCURRENT_PICKS * 16)
@@ -1694,11 +1896,13 @@ class BettingBot:
         
        
 
+        # Ventanas acotadas con las ultimas mediciones: las listas crecian sin
+        # limite durante toda la vida del proceso
         self.performance_stats = {
             'processed_picks': 0,
-            'validation_time': [],
-            'redis_time': [],
-            'telegram_time': [],
+            'validation_time': collections.deque(maxlen=10_000),
+            'redis_time': collections.deque(maxlen=10_000),
+            'telegram_time': collections.deque(maxlen=10_000),
             'last_stat_reset': time.time()
         }
 
@@ -1724,6 +1928,7 @@ class BettingBot:
         logger.addHandler(console_handler)
         
         # Handler para Telegram
+        self.telegram_log_handler = None
         if config.TELEGRAM_TOKENS and config.LOG_CHANNEL_ID:
             telegram_handler = TelegramLogHandler(
                 bot_token=config.TELEGRAM_TOKENS[0],
@@ -1735,6 +1940,7 @@ class BettingBot:
                 'Time: %(asctime)s'
             ))
             logger.addHandler(telegram_handler)
+            self.telegram_log_handler = telegram_handler
         
         self.logger = logger
 
@@ -1746,18 +1952,12 @@ class BettingBot:
             config,
             self.request_queue
         )
-        self.redis_handler = RedisHandler()
+        # Pool dimensionado a la concurrencia real de los workers de Redis
+        self.redis_handler = RedisHandler(max_connections=self.num_redis_workers)
         self.message_formatter = MessageFormatter()
 
     def _initialize_messaging_services(self, config: BotConfig) -> None:
         self.telegram_sender = TelegramSender(config.TELEGRAM_TOKENS)
-        self.telegram_semaphore = asyncio.Semaphore(30)
-        
-        self.bots = {}
-        for token in config.TELEGRAM_TOKENS:
-            bot = Bot(token=token)
-            bot._parse_mode = ParseMode.HTML
-            self.bots[token] = bot
 
     def _log_initialization_status(self) -> None:
         self.logger.info("BettingBot initialized with the following configuration:")
@@ -1776,9 +1976,6 @@ class BettingBot:
         
         try:
                        
-            # 2. Iniciar el request queue con su limpieza de cachÃ©
-            await self.request_queue.start_cache_cleanup()
-            
             # 3. Iniciar el prefetch manager optimizado
             await self.prefetch_manager.start_prefetching()
             
@@ -1832,117 +2029,150 @@ class BettingBot:
             
         return workers
 
+    @staticmethod
+    async def _get_batch(queue: asyncio.Queue, limit: int) -> list:
+        """Espera el primer elemento y anade sin bloquear los que ya esten en cola."""
+        items = [await queue.get()]
+        while len(items) < limit:
+            try:
+                items.append(queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return items
+
     async def validation_worker(self):
         """Worker para validaciÃ³n de picks"""
         while True:
             try:
-                pick = await self.validation_queue.get()
-                try:
-                    if await self.validate_pick(pick):
-                        await self.redis_queue.put(pick)
-                except Exception as e:
-                    self.logger.error(f"Error en validaciÃ³n: {e}")
-                finally:
-                    self.validation_queue.task_done()
+                batch = await self._get_batch(self.validation_queue, self.worker_batch_size)
+                for pick in batch:
+                    try:
+                        validation_start = time.time()
+                        if await self.validate_pick(pick):
+                            self.performance_stats['validation_time'].append(time.time() - validation_start)
+                            await self.redis_queue.put(pick)
+                    except Exception as e:
+                        self.logger.error("Error en validaciÃ³n: %s", e)
+                    finally:
+                        self.validation_queue.task_done()
             except asyncio.CancelledError:
                 break
             except Exception as e:
-                self.logger.error(f"Error crÃ­tico en validation_worker: {e}")
+                self.logger.error("Error crÃ­tico en validation_worker: %s", e)
                 await asyncio.sleep(1)
 
     async def redis_worker(self):
         """Worker para procesamiento Redis"""
         while True:
             try:
-                pick = await self.redis_queue.get()
+                # Bloquea hasta el primer pick y agrupa los que ya esten en cola
+                # para resolverlos con un MGET y un EVALSHA por lote
+                batch = await self._get_batch(self.redis_queue, self.redis_batch_size)
                 try:
-                    if not isinstance(pick, dict) or 'prongs' not in pick:
-                        continue
+                    redis_start = time.time()
+                    picks_data = []
+                    for pick in batch:
+                        bet_roles = self.determine_bet_roles(pick.prong1, pick.prong2)
+                        if not bet_roles:
+                            continue
+
+                        contrapartida, apuesta, target_bookmaker = bet_roles
+                        picks_data.append(
+                            self.prepare_pick_data(contrapartida, apuesta, pick.profit, target_bookmaker)
+                        )
 
-                    prong_1, prong_2 = pick['prongs']
-                    bet_roles = self.determine_bet_roles(prong_1, prong_2)
-                    
-                    if not bet_roles:
+                    if not picks_data:
                         continue
-                        
-                    contrapartida, apuesta, target_bookmaker = bet_roles
-                    
-                    pick_data = {
-                        'teams': apuesta['teams'],
-                        'time': apuesta['time'],
-                        'type': apuesta['type'],
-                        'contrapartida': contrapartida,
-                        'apuesta': apuesta,
-                        'profit': pick.get('profit', 0),
-                        'target_bookmaker': target_bookmaker,
-                        'tournament': apuesta.get('tournament', ''),
-                        'sport_id': apuesta.get('sport_id', '')
-                    }
-
-                    sent_status = await self.redis_handler.is_pick_sent_batch([pick_data])
-                    key = self.redis_handler._get_complete_key(pick_data)
-                        
-                    if not sent_status.get(key, False):
-                        guardado_exitoso = await self.redis_handler.mark_picks_sent_batch([pick_data])
-                        if guardado_exitoso:
+
+                    sent_status = await self.redis_handler.is_pick_sent_batch(picks_data)
+
+                    # Filtrar enviados y duplicados dentro del propio lote
+                    unsent, seen_keys = [], set()
+                    for pick_data in picks_data:
+                        key = self.redis_handler._get_complete_key(pick_data)
+                        if not sent_status.get(key, False) and key not in seen_keys:
+                            seen_keys.add(key)
+                            unsent.append(pick_data)
+
+                    if unsent and await self.redis_handler.mark_picks_sent_batch(unsent):
+                        self.performance_stats['redis_time'].append(time.time() - redis_start)
+                        for pick_data in unsent:
+                            telegram_start = time.time()
                             await self.telegram_queue.put(pick_data)
+                            self.performance_stats['telegram_time'].append(time.time() - telegram_start)
                             # Guardar en PostgreSQL
-                            
+
+                    self.performance_stats['processed_picks'] += len(picks_data)
 
                 except Exception as e:
-                    self.logger.error(f"Error en Redis: {e}", exc_info=True)
+                    self.logger.error("Error en Redis: %s", e, exc_info=self.logger.isEnabledFor(logging.DEBUG))
                 finally:
-                    self.redis_queue.task_done()
+                    for _ in batch:
+                        self.redis_queue.task_done()
                     
             except asyncio.CancelledError:
                 break
             except Exception as e:
-                self.logger.error(f"Error crÃ­tico en redis_worker: {e}")
+                self.logger.error("Error crÃ­tico en redis_worker: %s", e)
                 await asyncio.sleep(1)
 
     async def telegram_worker(self):
         """Worker para envÃ­o Telegram"""
         while True:
             try:
-                pick_data = await self.telegram_queue.get()
+                batch = await self._get_batch(self.telegram_queue, self.worker_batch_size)
                 try:
-                    if isinstance(pick_data, dict) and 'apuesta' in pick_data and 'contrapartida' in pick_data:
-                        message = await self.message_formatter.format_message(
-                            pick_data['apuesta'],
-                            pick_data['contrapartida'],
-                            pick_data.get('profit', 0)
-                        )
-                        if message:
-                            await self.telegram_sender.send_message_optimized(
-                                channel_id=self.config.BOOKMAKER_CHANNELS[pick_data['target_bookmaker']],
-                                message=message
+                    # Formatea todo el lote y envia en paralelo: drenar no debe
+                    # serializar los envios dentro de un mismo worker
+                    sends = []
+                    for pick_data in batch:
+                        if not (isinstance(pick_data, dict) and 'apuesta' in pick_data and 'contrapartida' in pick_data):
+                            continue
+                        try:
+                            message = await self.message_formatter.format_message(
+                                pick_data['apuesta'],
+                                pick_data['contrapartida'],
+                                pick_data.get('profit', 0)
+                            )
+                            if message:
+                                channel_id = self.config.BOOKMAKER_CHANNELS[pick_data['target_bookmaker']]
+                                sends.append(self.telegram_sender.send_message_optimized(
+                                    channel_id=channel_id,
+                                    message=message
+                                ))
+                        except Exception as e:
+                            self.logger.error("Error en Telegram: %s", e, exc_info=self.logger.isEnabledFor(logging.DEBUG))
+                    for result in await asyncio.gather(*sends, return_exceptions=True):
+                        if isinstance(result, Exception):
+                            self.logger.error(
+                                "Error en Telegram: %s", result,
+                                exc_info=result if self.logger.isEnabledFor(logging.DEBUG) else None
                             )
                 except Exception as e:
-                    self.logger.error(f"Error en Telegram: {e}", exc_info=True)
+                    self.logger.error("Error en Telegram: %s", e, exc_info=self.logger.isEnabledFor(logging.DEBUG))
                 finally:
-                    self.telegram_queue.task_done()
+                    for _ in batch:
+                        self.telegram_queue.task_done()
             except asyncio.CancelledError:
                 break
             except Exception as e:
-                self.logger.error(f"Error crÃ­tico en telegram_worker: {e}")
+                self.logger.error("Error crÃ­tico en telegram_worker: %s", e)
                 await asyncio.sleep(1)
 
-    async def validate_pick(self, surebet: dict) -> bool:
+    async def validate_pick(self, pick: PickTuple) -> bool:
         """Valida un pick de forma asÃ­ncrona"""
         try:
-            if not surebet or 'prongs' not in surebet or len(surebet['prongs']) != 2:
-                return False
-
-            prong_1, prong_2 = surebet['prongs']
-            profit = surebet.get('profit')
+            prong_1, prong_2, profit = pick.prong1, pick.prong2, pick.profit
 
             # Validar profit
             if profit is None or not (-1 <= profit <= 25):
                 return False
 
             # Validar cuotas
-            if not (self.config.MIN_ODDS <= float(prong_1['value']) <= self.config.MAX_ODDS and 
-                    self.config.MIN_ODDS <= float(prong_2['value']) <= self.config.MAX_ODDS):
+            config = self.config
+            min_odds, max_odds = config.MIN_ODDS, config.MAX_ODDS
+            if not (min_odds <= float(prong_1['value']) <= max_odds and
+                    min_odds <= float(prong_2['value']) <= max_odds):
                 return False
 
             # Determinar roles
@@ -1952,15 +2182,9 @@ class BettingBot:
 
             contrapartida, apuesta, target_bookmaker = bet_roles
 
-            # Validar tiempo del evento
-            tz_spain = pytz_timezone("Europe/Madrid")
-            event_time = datetime.fromtimestamp(
-                int(str(apuesta['time'])[:-3]),
-                tz=UTC
-            ).astimezone(tz_spain)
-            
-            current_time = datetime.now(tz_spain)
-            if (event_time - current_time).total_seconds() < self.config.MIN_EVENT_TIME:
+            # Validar tiempo del evento: diferencia de epochs, la zona horaria no
+            # afecta a los segundos que faltan
+            if int(apuesta['time']) // 1000 - time.time() < config.MIN_EVENT_TIME:
                 return False
 
             return True
@@ -1973,7 +2197,7 @@ class BettingBot:
         bk1, bk2 = prong_1['bk'], prong_2['bk']
         
         # Verificar si alguno es una casa objetivo
-        target_bookies = set(self.config.TARGET_BOOKIES)
+        target_bookies = self.config.TARGET_BOOKIES_SET
         if bk1 in target_bookies or bk2 in target_bookies:
             # Determinar cuÃ¡l es la casa objetivo y cuÃ¡l la contrapartida
             if bk1 in target_bookies:
@@ -1982,13 +2206,13 @@ class BettingBot:
                 apuesta, contrapartida = prong_2, prong_1
                 
             # Verificar si la contrapartida estÃ¡ permitida para esta casa
-            allowed_contrapartidas = self.config.BOOKIE_CONTRAPARTIDAS.get(apuesta['bk'], [])
+            allowed_contrapartidas = self.config.BOOKIE_CONTRAPARTIDAS_SETS.get(apuesta['bk'], ())
             if contrapartida['bk'] in allowed_contrapartidas:
                 return contrapartida, apuesta, apuesta['bk']
                 
         return None
     
-    def prepare_pick_data(self, contrapartida: dict, apuesta: dict, pick: dict, target_bookmaker: str) -> dict:
+    def prepare_pick_data(self, contrapartida: dict, apuesta: dict, profit: float, target_bookmaker: str) -> dict:
         """Prepara los datos del pick para su procesamiento"""
         return {
             'teams': apuesta['teams'],
@@ -1996,7 +2220,7 @@ class BettingBot:
             'type': apuesta['type'],
             'contrapartida': contrapartida,
             'apuesta': apuesta,
-            'profit': pick.get('profit', 0),
+            'profit': profit,
             'target_bookmaker': target_bookmaker,
             'tournament': apuesta.get('tournament', ''),
             'sport_id': apuesta.get('sport_id', '')
@@ -2016,28 +2240,28 @@ class BettingBot:
                     batch_size = len(picks)
                     self.logger.info(f"Procesando nuevo batch de {batch_size} picks")
                     
-                    valid_picks = [
-                        pick for pick in picks 
-                        if len(pick.get('prongs', [])) == 2
-                    ]
+                    valid_picks = []
+                    for pick in picks:
+                        if not isinstance(pick, dict):
+                            continue
+                        prongs = pick.get('prongs')
+                        if prongs and len(prongs) == 2:
+                            valid_picks.append(
+                                PickTuple(prongs[0], prongs[1], pick.get('profit'), pick)
+                            )
                     
-                    # Procesamiento en lotes mÃ¡s grandes
-                    tasks = []
+                    # Fan-out a los workers ya arrancados: sin una Task por pick,
+                    # y validacion/redis/telegram se solapan entre si
                     for pick in valid_picks:
-                        task = asyncio.create_task(self.process_single_pick(pick))
-                        tasks.append(task)
-                    
-                    if tasks:
-                        await asyncio.gather(*tasks)
+                        await self.validation_queue.put(pick)
+                    await self.validation_queue.join()
                         
                     batch_time = time.time() - batch_start
                     self.logger.info(
                         f"Batch procesado en {batch_time:.2f}s. "
                         f"Velocidad: {batch_size/batch_time:.1f} picks/s"
                     )
-                
-                # Reducir intervalo de sleep
-                await asyncio.sleep(0.01)
+                # Sin sleep: get_next_data ya espera en la cola de prefetch
                 
         except asyncio.CancelledError:
             for worker in workers:
@@ -2045,50 +2269,6 @@ class BettingBot:
             await asyncio.gather(*workers, return_exceptions=True)
             raise
 
-    async def process_single_pick(self, pick):
-        """Procesa un Ãºnico pick de manera optimizada"""
-        start_time = time.time()
-        
-        try:
-            # ValidaciÃ³n
-            validation_start = time.time()
-            if not await self.validate_pick(pick):
-                return
-            self.performance_stats['validation_time'].append(time.time() - validation_start)
-            
-            # Redis
-            redis_start = time.time()
-            if not isinstance(pick, dict) or 'prongs' not in pick:
-                return
-                
-            prong_1, prong_2 = pick['prongs']
-            bet_roles = self.determine_bet_roles(prong_1, prong_2)
-            if not bet_roles:
-                return
-                
-            contrapartida, apuesta, target_bookmaker = bet_roles
-            pick_data = self.prepare_pick_data(contrapartida, apuesta, pick, target_bookmaker)
-            
-            sent_status = await self.redis_handler.is_pick_sent_batch([pick_data])
-            key = self.redis_handler._get_complete_key(pick_data)
-            
-            if not sent_status.get(key, False):
-                if await self.redis_handler.mark_picks_sent_batch([pick_data]):
-                    self.performance_stats['redis_time'].append(time.time() - redis_start)
-                    
-                                        
-                    # Telegram
-                    telegram_start = time.time()
-                    await self.telegram_queue.put(pick_data)
-                    self.performance_stats['telegram_time'].append(time.time() - telegram_start)
-            
-            self.performance_stats['processed_picks'] += 1
-            
-                            
-        except Exception as e:
-            self.logger.error(f"Error processing pick: {e}")
-            
-            
     async def cleanup(self):
         """Limpieza ordenada de recursos"""
         try:
@@ -2110,6 +2290,8 @@ class BettingBot:
                 (self.telegram_sender.cleanup, "TelegramSender"),
                 (self.prefetch_manager.cleanup, "PrefetchManager")
             ]
+            if self.telegram_log_handler is not None:
+                cleanup_sequence.append((self.telegram_log_handler.aclose, "TelegramLogHandler"))
             
             for cleanup_func, resource_name in cleanup_sequence:
                 try:
@@ -2169,15 +2351,16 @@ class BettingBot:
             return
 
         try:
-            async with self.telegram_semaphore:
-                await self.telegram_sender.send_message_optimized(
-                    channel_id=channel_id,
-                    message=message
-                )
+            # Sin semaforo propio: el limitador por bot de TelegramSender ya
+            # acota el ritmo de envio
+            await self.telegram_sender.send_message_optimized(
+                channel_id=channel_id,
+                message=message
+            )
         except Exception as e:
             self.logger.error(f"Error sending telegram message: {e}")
             # Agregar a cola de reintentos
-            await self.telegram_sender.message_queue.put((1, (channel_id, message, 0)))
+            self.telegram_sender.enqueue(1, (channel_id, message, 0))
 
     def get_bookie_level(self, bookie: str) -> int:
         """Obtiene el nivel de jerarquÃ­a de una casa de apuestas"""
@@ -2218,6 +2401,9 @@ async def main():
         await bot.cleanup()
 
 if __name__ == "__main__":
+    if uvloop is not None:
+        # Bucle libuv: mas rendimiento en sockets (aiohttp, aiogram, redis)
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -1,7 +1,18 @@
 import os
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image, ImageOps, ImageChops
 import numpy as np
 
+try:
+    from numba import njit, prange
+except ImportError:  # Optional JIT, fall back to plain NumPy
+    njit = None
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
 SOURCE_DIR = "src/web/static/img"
 
 # Mapeo de archivos y funciones a aplicar
@@ -27,6 +38,17 @@ CONFIG = [
 
 def trim(im):
     """Autocrop image removing empty borders"""
+    if im.mode == "RGBA":
+        # Same box as the difference/getbbox path below (getbbox only looks at
+        # alpha on RGBA): pixels whose alpha differs from the corner by > 100
+        alpha = np.asarray(im)[:, :, 3].astype(np.int16)
+        mask = np.abs(alpha - alpha[0, 0]) > 100
+        rows = np.flatnonzero(mask.any(axis=1))
+        if rows.size == 0:
+            return im
+        cols = np.flatnonzero(mask.any(axis=0))
+        return im.crop((int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1))
+
     bg = Image.new(im.mode, im.size, im.getpixel((0,0)))
     diff = ImageChops.difference(im, bg)
     diff = ImageChops.add(diff, diff, 2.0, -100)
@@ -35,39 +57,39 @@ def trim(im):
         return im.crop(bbox)
     return im
 
+def _white_mask(data, threshold=200):
+    """Boolean mask of the RGBA pixels whose R, G and B are all > threshold."""
+    if cv2 is not None:
+        # inRange is inclusive and SIMD-vectorized; alpha accepts any value
+        lo = (threshold + 1, threshold + 1, threshold + 1, 0)
+        return cv2.inRange(data, lo, (255, 255, 255, 255)) != 0
+    r, g, b = data[:, :, 0], data[:, :, 1], data[:, :, 2]
+    return (r > threshold) & (g > threshold) & (b > threshold)
+
 def remove_white_bg(img):
-    img = img.convert("RGBA")
-    datas = img.getdata()
-    new_data = []
-    for item in datas:
-        # If white-ish, make transparent
-        if item[0] > 200 and item[1] > 200 and item[2] > 200:
-            new_data.append((255, 255, 255, 0))
-        else:
-            new_data.append(item)
-    img.putdata(new_data)
-    return img
+    if img.mode != "RGBA":
+        img = img.convert("RGBA")
+    data = np.array(img)
+    # If white-ish, make transparent
+    white = _white_mask(data)
+    data[white] = (255, 255, 255, 0)
+    return Image.fromarray(data)
 
 def make_white_text(img):
     """
     Turns non-white pixels into pure white. Keeps transparency.
     If image has white background, remove it first.
     """
-    img = img.convert("RGBA")
-    # First, simple white removal if it's a solid block
-    img = remove_white_bg(img)
-    
-    datas = img.getdata()
-    new_data = []
-    for item in datas:
-        # If transparent, keep transparent
-        if item[3] == 0:
-            new_data.append(item)
-        else:
-            # If visible, make it white
-            new_data.append((255, 255, 255, 255))
-    img.putdata(new_data)
-    return img
+    if img.mode != "RGBA":
+        img = img.convert("RGBA")
+    data = np.array(img)
+    # White removal and whitening in one pass: white-ish pixels become
+    # transparent, already transparent ones are kept, the rest turn white
+    white = _white_mask(data)
+    visible = ~white & (data[:, :, 3] != 0)
+    data[white] = (255, 255, 255, 0)
+    data[visible] = (255, 255, 255, 255)
+    return Image.fromarray(data)
 
 def sportium_red(img):
     """
@@ -88,92 +110,42 @@ def sportium_red(img):
     Assuming original is: Red Rect + White Text + White BG outside.
     My previous `sportium_red` might have removed the white text making it transparent.
     """
-    img = img.convert("RGBA")
-    
-    # First remove outer white background
-    datas = img.getdata()
-    new_data = []
-    
-    for item in datas:
-        r, g, b, a = item
-        
-        # Is it White Background? (High R, G, B)
-        if r > 220 and g > 220 and b > 220:
-             new_data.append((255, 255, 255, 0)) # Transparent
-        
-        # Is it Red? (High R, Low G/B)
-        elif r > 150 and g < 100 and b < 100:
-            new_data.append(item) # Keep Red
-            
-        # Is it the Text? (If it was white, we effectively removed it above). 
-        # Ah, if the text is WHITE in the original, `remove_white` logic kills it.
-        # We need to distinguish "White Text inside Red" vs "White Background outside".
-        # This is hard without flood fill.
-        
-        # Alternative: If the user says "letters lack background", maybe they are transparent holes.
-        # So, if I see transparency (after some processing) I should fill it? No.
-        
-        # Let's try:
-        # If it is NOT Red and NOT White-BG -> It must be text?
-        # If original text is White, it matches White-BG condition.
-        # TRICK: Sportium red is usually a box.
-        # Let's just assume we want to turn the transparent parts back to white? No.
-        
-        # New strategy:
-        # 1. Detect Red Box.
-        # 2. Inside Red Box, make everything else White.
-        # But honestly, without computer vision, differentiating 'White Text' from 'White BG' is tricky if they are connected.
-        # Usually logos have a gap.
-        
-        # Simple Fix: Assuming text is distinct.
-        # If pixel is PURE WHITE -> It's text (keep it 255,255,255,255).
-        # But wait, BG is also white.
-        # Trim first?
-        # Let's just use a crop logic or "central white is text".
-        # Or, usually Sportium logo file has a slight difference.
-        
-        # Let's try this:
-        # Keep everything. Just Trim.
-        # If user provided a file with White BG, Red Box, White Text...
-        # I will simply TRIM the image first (removing outer white).
-        # Any white remaining inside is text.
-        
-        else:
-             # Whatever else (dark text?), make it White
-             new_data.append((255, 255, 255, 255))
-             
-    # This logic is flawed if text is white.
-    # Let's do:
-    # 1. Trim White borders.
+    if img.mode != "RGBA":
+        img = img.convert("RGBA")
+
+    # 1. Trim borders (removes surrounding white if it touches edges).
     # 2. Then any white remaining is text.
-    pass 
+    img2 = trim(img)
 
-    img2 = trim(img) # This removes surrounding white if it touches edges.
-    
-    # Now process pixels of trimmed image
-    datas = img2.getdata()
-    new_data = []
-    for item in datas:
-        r,g,b,a = item
-        # If white (or close), keep it White (Text)
-        if r > 200 and g > 200 and b > 200:
-             new_data.append((255, 255, 255, 255))
-        # If red, keep red
-        elif r > 150 and g < 100:
-             new_data.append(item)
-        else:
-             # Make transparent (outer artifacts)
-             new_data.append((255, 255, 255, 0))
-             
-    img2.putdata(new_data)
-    return img2
+    data = np.array(img2)
+    # If white (or close), keep it White (Text)
+    is_white = _white_mask(data)
+    # If red, keep red
+    is_red = ~is_white & (data[:, :, 0] > 150) & (data[:, :, 1] < 100)
+    # Anything else: make transparent (outer artifacts)
+    data[is_white] = (255, 255, 255, 255)
+    data[~(is_white | is_red)] = (255, 255, 255, 0)
+    return Image.fromarray(data)
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _neon_alpha(data):
+        """Fused max(R,G,B) * 2 clipped to 255, written straight into alpha."""
+        for y in prange(data.shape[0]):
+            for x in range(data.shape[1]):
+                v = 2 * int(max(data[y, x, 0], data[y, x, 1], data[y, x, 2]))
+                data[y, x, 3] = 255 if v > 255 else v
 
 def neon_black_to_alpha(img):
     """
     Logo V5: Black to Transparent.
     """
-    img = img.convert("RGBA")
+    if img.mode != "RGBA":
+        img = img.convert("RGBA")
     data = np.array(img)
+    if njit is not None:
+        _neon_alpha(data)
+        return Image.fromarray(data)
     # Alpha = Max(R,G,B)
     new_alpha = np.max(data[:, :, :3], axis=2)
     # Boost alpha
@@ -187,36 +159,52 @@ def crop_remove_white(img):
     img = trim(img)
     return img
 
-def process_images():
-    print("Starting V5 Image Processing...")
+def _process_one(job):
+    """Process one (source, method) pair of CONFIG and write all its targets."""
+    source, method_name, targets = job
+    source_path = os.path.join(SOURCE_DIR, source)
     
-    for source, target, method_name in CONFIG:
-        source_path = os.path.join(SOURCE_DIR, source)
-        target_path = os.path.join(SOURCE_DIR, target)
+    if not os.path.exists(source_path):
+        print(f"MISSING: {source}")
+        return
         
-        if not os.path.exists(source_path):
-            print(f"MISSING: {source}")
-            continue
-            
-        try:
-            img = Image.open(source_path)
+    try:
+        img = Image.open(source_path)
+        
+        if method_name == "remove_white":
+            img = remove_white_bg(img)
+        elif method_name == "make_white":
+            img = make_white_text(img)
+        elif method_name == "sportium_red":
+            img = sportium_red(img)
+        elif method_name == "neon_black_to_alpha":
+            img = neon_black_to_alpha(img)
+        elif method_name == "crop_remove_white":
+            img = crop_remove_white(img)
             
-            if method_name == "remove_white":
-                img = remove_white_bg(img)
-            elif method_name == "make_white":
-                img = make_white_text(img)
-            elif method_name == "sportium_red":
-                img = sportium_red(img)
-            elif method_name == "neon_black_to_alpha":
-                img = neon_black_to_alpha(img)
-            elif method_name == "crop_remove_white":
-                img = crop_remove_white(img)
-                
-            img.save(target_path, "PNG")
+        for target in targets:
+            # compress_level=1: fastest zlib setting, size is negligible for logos
+            img.save(os.path.join(SOURCE_DIR, target), "PNG", compress_level=1)
             print(f"Processed [{method_name}]: {source} -> {target}")
-            
-        except Exception as e:
-            print(f"ERROR {source}: {e}")
+        
+    except Exception as e:
+        print(f"ERROR {source}: {e}")
+
+def process_images(config=CONFIG):
+    print("Starting V5 Image Processing...")
+    
+    # Entries sharing (source, method) give the same image (logo_v5.png):
+    # decode and process it once, then write every target
+    jobs = {}
+    for source, target, method_name in config:
+        jobs.setdefault((source, method_name), []).append(target)
+
+    # Each logo is independent and decode/encode is CPU-bound: one process per core
+    with ProcessPoolExecutor() as executor:
+        list(executor.map(
+            _process_one,
+            [(source, method_name, targets) for (source, method_name), targets in jobs.items()],
+        ))
 
 if __name__ == "__main__":
     process_images()